@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+CACHE_DIR = Path(
+    os.environ.get(
+        "FANTASY_NBA_CACHE_DIR", Path(__file__).parent.parent / "data" / "cache"
+    )
+)
+MAX_CACHE_BYTES = 256 * 1024 * 1024
+EVICT_EVERY = 32
+
+# seconds a response is served from disk without asking the server again, first
+# match wins; stale entries are revalidated with If-None-Match/If-Modified-Since
+TTLS = [
+    (r"/bootstrap-static/$", 60 * 60),
+    (r"/element-summary/\d+/$", 6 * 60 * 60),
+    (r"/entry/\d+/event/\d+/picks/$", 15 * 60),
+    (r"/entry/\d+/(history|transfers)/$", 15 * 60),
+    (r"dunksandthrees\.com", 6 * 60 * 60),
+    (r"sports\.yahoo\.com/nba/injuries", 60 * 60),
+]
+DEFAULT_TTL = 0
+
+_lock = threading.Lock()
+_stores = 0
+
+
+def ttl_for(url):
+    for pattern, ttl in TTLS:
+        if re.search(pattern, url):
+            return ttl
+    return DEFAULT_TTL
+
+
+def _paths(url):
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return CACHE_DIR / f"{key}.meta.json", CACHE_DIR / f"{key}.body"
+
+
+def load(url):
+    meta_path, body_path = _paths(url)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        body = body_path.read_bytes()
+    except (OSError, ValueError):
+        return None
+    if meta.get("url") != url:
+        return None
+    return meta, body
+
+
+def is_fresh(meta, url):
+    return time.time() - meta["fetched_at"] < ttl_for(url)
+
+
+def conditional_headers(meta):
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
+
+
+def _write_atomic(path, data):
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def store(url, response):
+    global _stores
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    meta = {
+        "url": url,
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "encoding": response.encoding,
+        "content_type": response.headers.get("Content-Type"),
+        "fetched_at": time.time(),
+    }
+    meta_path, body_path = _paths(url)
+    _write_atomic(body_path, response.content)
+    _write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+    with _lock:
+        _stores += 1
+        due = _stores % EVICT_EVERY == 0
+    if due:
+        evict()
+    return meta
+
+
+def touch(url, meta):
+    """Mark a revalidated (304) entry as freshly fetched."""
+    meta["fetched_at"] = time.time()
+    meta_path, _ = _paths(url)
+    _write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+
+
+def evict(max_bytes=MAX_CACHE_BYTES):
+    """Drop least recently fetched entries until the cache fits in max_bytes."""
+    with _lock:
+        entries = []
+        total = 0
+        for meta_path in CACHE_DIR.glob("*.meta.json"):
+            body_path = meta_path.with_name(
+                meta_path.name.replace(".meta.json", ".body")
+            )
+            try:
+                size = meta_path.stat().st_size + body_path.stat().st_size
+                used = meta_path.stat().st_mtime
+            except OSError:
+                continue
+            entries.append((used, size, meta_path, body_path))
+            total += size
+        for _, size, meta_path, body_path in sorted(entries):
+            if total <= max_bytes:
+                break
+            for path in (meta_path, body_path):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            total -= size
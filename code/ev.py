@@ -0,0 +1,114 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+EV_STATE_FILE = DATA_DIR / "ev_state.npz"
+EV_STATE_KEYS = ["ids", "days", "player_keys", "cell_keys", "is_home", "ev", "settings"]
+
+STAT_COLS = ["PTS", "TREB", "AST", "STL", "BLK", "TO"]
+STAT_WEIGHTS = [1, 1.2, 1.5, 3, 3, -1]
+
+
+def hashtag_ev(stats, player_row, opponent, is_home, ratings, home, away):
+    """EV of every game from hashtag per-game stats.
+
+    stats is (player x stat) and ratings the (team x stat) defensive
+    multipliers in the same stat order. Games come as parallel arrays: the
+    player's row in stats, the opposing team's row in ratings (-1 if it has no
+    rating, which scores 0) and whether the player is at home. Each player's
+    EV against every team is one matrix product; the games are then gathered
+    from it and scaled by venue.
+    """
+    vs_team = stats @ ratings.T
+    ev = vs_team[player_row, np.maximum(opponent, 0)]
+    ev *= np.where(is_home, home, away)
+    ev[opponent < 0] = 0
+    return ev
+
+
+def row_keys(values):
+    """One hash per row of a 2-D array."""
+    return pd.util.hash_pandas_object(pd.DataFrame(values), index=False).to_numpy()
+
+
+def load_ev_state(state_path):
+    try:
+        with np.load(state_path) as state:
+            return {key: state[key] for key in EV_STATE_KEYS}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def cached_ev_matrix(
+    ids,
+    days,
+    stats,
+    opponent,
+    is_home,
+    ratings,
+    home,
+    away,
+    state_path=EV_STATE_FILE,
+):
+    """(player x day) hashtag EV, recomputing only cells whose inputs changed.
+
+    ids and days label the rows and columns, stats is (player x stat),
+    opponent the (player x day) row of each game's opponent in ratings (-1 for
+    no game or no rating) and is_home the venue. A cell is taken from the last
+    run's matrix when its player's stats row, its venue, its opponent's rating
+    row and the home/away settings all match; the others are computed and the
+    whole matrix is saved for the next run.
+    """
+    player_keys = row_keys(stats)
+    cell_keys = np.append(row_keys(ratings), np.uint64(0))[opponent]
+    settings = np.array([home, away], dtype=float)
+
+    ev = np.zeros(opponent.shape)
+    todo = np.ones(opponent.shape, dtype=bool)
+    old = load_ev_state(state_path)
+    if (
+        old is not None
+        and len(old["ids"])
+        and len(old["days"])
+        and np.array_equal(old["settings"], settings)
+    ):
+        rows = pd.Index(old["ids"]).get_indexer(ids)
+        cols = pd.Index(old["days"]).get_indexer(days)
+        r, c = np.maximum(rows, 0)[:, None], np.maximum(cols, 0)[None, :]
+        same = (
+            (rows >= 0)[:, None]
+            & (cols >= 0)[None, :]
+            & (old["player_keys"][r] == player_keys[:, None])
+            & (old["cell_keys"][r, c] == cell_keys)
+            & (old["is_home"][r, c] == is_home)
+        )
+        ev[same] = old["ev"][r, c][same]
+        todo = ~same
+    if todo.any():
+        p, d = np.nonzero(todo)
+        ev[p, d] = hashtag_ev(
+            stats, p, opponent[p, d], is_home[p, d], ratings, home, away
+        )
+    print(f"EV reused for {ev.size - todo.sum()} of {ev.size} cells")
+    if (
+        old is not None
+        and not todo.any()
+        and np.array_equal(old["ids"], ids)
+        and np.array_equal(old["days"], np.asarray(days, dtype=str))
+    ):
+        return ev
+
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(
+        state_path,
+        ids=np.asarray(ids),
+        days=np.asarray(days, dtype=str),
+        player_keys=player_keys,
+        cell_keys=cell_keys,
+        is_home=is_home,
+        ev=ev,
+        settings=settings,
+    )
+    return ev
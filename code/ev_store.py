@@ -0,0 +1,99 @@
+"""Typed on-disk store for EV sheets (NBA_EV, mou).
+
+Sheets are written as uncompressed Arrow IPC (Feather v2) files so they load
+memory-mapped with their dtypes intact: int32 ids, small ints for cost,
+position and team, categorical names and float32 gameday columns. pyarrow is
+optional; without it, or when the CSV beside the store is newer (e.g. a
+hand-made NBA_EV.csv), the CSV is used instead.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+except ImportError:
+    pa = None
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+CATEGORY_COLS = ["name", "team"]
+
+
+def store_path(sheet, data_dir=DATA_DIR):
+    return data_dir / f"{sheet}.arrow"
+
+
+def csv_path(sheet, data_dir=DATA_DIR):
+    return data_dir / f"{sheet}.csv"
+
+
+def whole_numbers(values):
+    if pd.api.types.is_integer_dtype(values):
+        return values
+    if (
+        pd.api.types.is_float_dtype(values)
+        and values.notna().all()
+        and (values % 1 == 0).all()
+    ):
+        return values.astype(np.int64)
+    return None
+
+
+def compact(player_data):
+    """Return player_data with the store's compact dtypes."""
+    player_data = player_data.reset_index(drop=True)
+    for col in player_data.columns:
+        values = player_data[col]
+        if col == "id":
+            values = pd.to_numeric(values, errors="coerce").fillna(0)
+            player_data[col] = values.astype(np.int32)
+        elif col in CATEGORY_COLS:
+            ints = whole_numbers(values)
+            values = values if ints is None else ints
+            player_data[col] = values.astype("category")
+        elif col in ("now_cost", "element_type") and whole_numbers(values) is not None:
+            player_data[col] = pd.to_numeric(whole_numbers(values), downcast="integer")
+        elif pd.api.types.is_float_dtype(values):
+            player_data[col] = values.astype(np.float32)
+        elif pd.api.types.is_integer_dtype(values):
+            player_data[col] = pd.to_numeric(values, downcast="integer")
+    return player_data
+
+
+def save_ev(player_data, sheet, export_csv=False, data_dir=DATA_DIR):
+    """Write an EV sheet to the store, and to CSV if asked or without pyarrow."""
+    player_data = compact(player_data)
+    # the csv goes first so the store is the newer file when both are written
+    if export_csv or pa is None:
+        player_data.to_csv(csv_path(sheet, data_dir), index=False, encoding="utf-8-sig")
+    if pa is not None:
+        table = pa.Table.from_pandas(player_data, preserve_index=False)
+        feather.write_feather(
+            table, store_path(sheet, data_dir), compression="uncompressed"
+        )
+
+
+def read_csv(path):
+    try:
+        player_data = pd.read_csv(path, encoding="utf-8-sig")
+    except UnicodeDecodeError:
+        player_data = pd.read_csv(path, encoding="ISO-8859-1")
+    return compact(player_data)
+
+
+def load_ev(sheet, data_dir=DATA_DIR):
+    """Load an EV sheet from the store, or its CSV if that is all there is."""
+    arrow, csv = store_path(sheet, data_dir), csv_path(sheet, data_dir)
+    use_store = arrow.exists() and pa is not None
+    if use_store and csv.exists() and csv.stat().st_mtime > arrow.stat().st_mtime:
+        print(f"{csv.name} is newer than {arrow.name}, loading the csv")
+        use_store = False
+    if use_store:
+        return feather.read_table(arrow, memory_map=True).to_pandas()
+    if not csv.exists():
+        raise FileNotFoundError(f"No EV sheet found at {arrow} or {csv}")
+    return read_csv(csv)
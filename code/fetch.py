@@ -0,0 +1,232 @@
+import email.utils
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import cache
+import replay
+
+API_BASE = os.environ.get("FANTASY_NBA_API_BASE", "https://nbafantasy.nba.com/api/")
+# see replay.py: capture every response to an archive / send requests to the
+# local stand-in server instead of the live services (disables the disk cache)
+RECORD_PATH = os.environ.get("FANTASY_NBA_RECORD")
+REPLAY_URL = os.environ.get("FANTASY_NBA_REPLAY_URL")
+if RECORD_PATH:
+    replay.start_recording(RECORD_PATH)
+
+MAX_WORKERS = 8
+REQUESTS_PER_SECOND = 10.0
+BURST = 10
+TIMEOUT = (5, 30)  # (connect, read) seconds
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class RateLimiter:
+    """Token bucket shared by all workers of a fetch.
+
+    The refill rate is halved every time the server answers 429 and creeps back
+    up to the configured rate on each success, and a Retry-After pauses every
+    worker rather than only the one that was throttled.
+    """
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, burst=BURST):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def throttled(self, delay):
+        with self.lock:
+            self.rate = max(self.rate / 2, 0.5)
+            self.tokens = 0
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+    def succeeded(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + 0.1 * self.max_rate)
+
+
+def make_session(pool_size=MAX_WORKERS, verify=True):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.verify = verify
+    return session
+
+
+def retry_after_seconds(response):
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def backoff_seconds(attempt):
+    delay = min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt)
+    return delay * (0.5 + random.random() / 2)
+
+
+def get(url, session, limiter=None, timeout=TIMEOUT, headers=None):
+    """GET a url, retrying throttled, failed and timed out requests.
+
+    Non-retryable responses (including 404s, whose JSON body callers inspect)
+    are returned as-is; the last error is raised once retries run out.
+    """
+    if REPLAY_URL:
+        url = REPLAY_URL.rstrip("/") + replay.local_path(url)
+    for attempt in range(MAX_RETRIES + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            r = session.get(url, timeout=timeout, headers=headers)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == MAX_RETRIES:
+                raise
+            time.sleep(backoff_seconds(attempt))
+            continue
+
+        if r.status_code not in RETRY_STATUSES:
+            if limiter is not None:
+                limiter.succeeded()
+            return r
+        if attempt == MAX_RETRIES:
+            r.raise_for_status()
+
+        delay = retry_after_seconds(r)
+        if delay is None:
+            delay = backoff_seconds(attempt)
+        if r.status_code == 429:
+            print(f"Too many requests, backing off for {delay:.1f}s")
+            if limiter is not None:
+                limiter.throttled(delay)
+                continue
+        time.sleep(delay)
+    return r
+
+
+def fetch(
+    url, session, limiter=None, timeout=TIMEOUT, use_cache=True, raise_errors=False
+):
+    """Return (body, encoding) for url, served from the disk cache while fresh.
+
+    Stale entries are revalidated with a conditional request so an unchanged
+    payload costs a 304 instead of a full download.
+    """
+    use_cache = use_cache and not REPLAY_URL
+    entry = cache.load(url) if use_cache else None
+    headers = None
+    if entry is not None:
+        meta, body = entry
+        if cache.is_fresh(meta, url):
+            return cached_body(url, meta, body)
+        headers = cache.conditional_headers(meta)
+
+    r = get(url, session, limiter, timeout, headers)
+    if entry is not None and r.status_code == 304:
+        cache.touch(url, meta)
+        return cached_body(url, meta, body)
+    if raise_errors:
+        r.raise_for_status()
+    if r.encoding is None:
+        r.encoding = r.apparent_encoding
+    if use_cache and r.status_code == 200:
+        cache.store(url, r)
+    if RECORD_PATH:
+        replay.record(url, r.status_code, r.headers, r.content)
+    return r.content, r.encoding
+
+
+def cached_body(url, meta, body):
+    if RECORD_PATH:
+        headers = (
+            {"Content-Type": meta.get("content_type")}
+            if meta.get("content_type")
+            else {}
+        )
+        replay.record(url, 200, headers, body)
+    return body, meta["encoding"]
+
+
+def get_json(
+    url, session=None, limiter=None, timeout=TIMEOUT, use_cache=True, verify=True
+):
+    if session is None:
+        with make_session(pool_size=1, verify=verify) as own_session:
+            body, _ = fetch(url, own_session, limiter, timeout, use_cache)
+    else:
+        body, _ = fetch(url, session, limiter, timeout, use_cache)
+    return json.loads(body)
+
+
+def get_text(url, headers=None, timeout=TIMEOUT, use_cache=True, verify=True):
+    with make_session(pool_size=1, verify=verify) as session:
+        if headers:
+            session.headers.update(headers)
+        body, encoding = fetch(
+            url, session, None, timeout, use_cache, raise_errors=True
+        )
+    return body.decode(encoding or "utf-8", errors="replace")
+
+
+def fetch_json_many(
+    urls,
+    max_workers=MAX_WORKERS,
+    rate=REQUESTS_PER_SECOND,
+    timeout=TIMEOUT,
+    verify=True,
+    session=None,
+    use_cache=True,
+):
+    """Fetch many JSON urls concurrently, returning bodies in input order."""
+    urls = list(urls)
+    if not urls:
+        return []
+    limiter = RateLimiter(rate=rate, burst=min(BURST, max_workers))
+    own_session = session is None
+    if own_session:
+        session = make_session(pool_size=max_workers, verify=verify)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(
+                pool.map(
+                    lambda u: get_json(u, session, limiter, timeout, use_cache), urls
+                )
+            )
+    finally:
+        if own_session:
+            session.close()
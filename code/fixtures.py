@@ -0,0 +1,227 @@
+import hashlib
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from fetch import API_BASE, fetch_json_many, get_json
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+FIXTURE_FILE = DATA_DIR / "fixtures.csv"
+STATE_FILE = DATA_DIR / "fixtures_state.json"
+
+# a team's cached schedule is trusted until a gameday passes or it gets this old
+MAX_SCHEDULE_AGE = 12 * 60 * 60
+
+TEAM_FIXTURE_COLS = ["team_h", "team_a", "event_name", "is_home"]
+
+
+def get_team_fixtures(player_info, use_cache=True):
+    # fixtures only depend on the team, so one element-summary per team is
+    # fetched and later expanded to every player on that team
+    team_fixtures = []
+    remaining = player_info[["id", "team"]]
+    while not remaining.empty:
+        reps = remaining.groupby("team").first().reset_index()
+        urls = [f"{API_BASE}element-summary/{i}/" for i in reps["id"]]
+        found = []
+        summaries = fetch_json_many(urls, use_cache=use_cache)
+        for team, summary in zip(reps["team"], summaries):
+            if summary == {"detail": "Not found."}:
+                continue
+            else:
+                data = pd.DataFrame(summary["fixtures"], columns=TEAM_FIXTURE_COLS)
+                data["team"] = team
+                team_fixtures.append(data[["team"] + TEAM_FIXTURE_COLS])
+                found.append(team)
+        # retry teams whose representative had no summary with the next player
+        remaining = remaining[
+            ~remaining["team"].isin(found) & ~remaining["id"].isin(reps["id"])
+        ]
+    return pd.concat(team_fixtures, ignore_index=True)
+
+
+def expand_to_players(player_info, team_fixtures):
+    fixtures = player_info[["id", "team"]].merge(team_fixtures, on="team")
+    return fixtures[["team_h", "team_a", "event_name", "is_home", "id"]]
+
+
+def get_fixture_info(player_info):
+    return expand_to_players(player_info, get_team_fixtures(player_info))
+
+
+def clean_fixture_info(fixture_info):
+    fixture_info["opp_team"] = np.where(
+        fixture_info["is_home"], fixture_info["team_a"], fixture_info["team_h"]
+    )
+    fixture_info["location"] = np.where(fixture_info["is_home"], "home", "away")
+    fixture_info = fixture_info[["id", "event_name", "location", "opp_team"]]
+    fixture_info = fixture_info.dropna()
+    return fixture_info
+
+
+def schedule_fingerprint(schedule):
+    rows = sorted(
+        f"{f['event_name']}|{f['team_h']}|{f['team_a']}"
+        for f in schedule.to_dict("records")
+    )
+    return hashlib.sha1("\n".join(rows).encode("utf-8")).hexdigest()
+
+
+def upcoming_events():
+    events = get_json(f"{API_BASE}bootstrap-static/")["events"]
+    upcoming = [x for x in events if not x.get("finished", False)]
+    next_event = upcoming[0]["name"] if upcoming else None
+    return [x["name"] for x in upcoming], next_event
+
+
+def load_state(state_path):
+    if not state_path.exists():
+        return {"teams": {}}
+    with open(state_path) as f:
+        return json.load(f)
+
+
+def refresh_fixtures(
+    player_info, mode="incremental", fixture_path=FIXTURE_FILE, state_path=STATE_FILE
+):
+    """Bring fixtures.csv up to date and return it, or None if nothing was built.
+
+    mode "full" refetches every team, "incremental" drops played gamedays and
+    only refetches teams whose schedule was last checked before the current
+    gameday (or longer than MAX_SCHEDULE_AGE ago), comparing schedule
+    fingerprints to report postponed or added games. Any other mode keeps the
+    old behaviour of building the file only when it is missing.
+    """
+    if mode not in ("full", "incremental"):
+        if fixture_path.exists():
+            return None
+        fixture_info = clean_fixture_info(get_fixture_info(player_info))
+        fixture_info.to_csv(fixture_path, index=False)
+        return fixture_info
+
+    upcoming, next_event = upcoming_events()
+    state = load_state(state_path) if mode == "incremental" else {"teams": {}}
+    now = time.time()
+
+    schedules = {}
+    stale_teams = []
+    for team in sorted(player_info["team"].unique()):
+        cached = state["teams"].get(str(team))
+        if (
+            cached is None
+            or cached["checked_event"] != next_event
+            or now - cached["checked_at"] > MAX_SCHEDULE_AGE
+        ):
+            stale_teams.append(team)
+        if cached is not None:
+            schedule = pd.DataFrame(cached["fixtures"], columns=TEAM_FIXTURE_COLS)
+            schedules[team] = schedule[schedule["event_name"].isin(upcoming)]
+
+    if stale_teams:
+        print(f"Refreshing fixtures for {len(stale_teams)} team(s)")
+        # the state above already decided these are stale, so skip the
+        # response cache, which could still hold a schedule from before
+        fetched = get_team_fixtures(
+            player_info[player_info["team"].isin(stale_teams)], use_cache=False
+        )
+        for team, schedule in fetched.groupby("team"):
+            schedule = schedule[TEAM_FIXTURE_COLS]
+            schedule = schedule[schedule["event_name"].isin(upcoming)]
+            if team in schedules and schedule_fingerprint(
+                schedule
+            ) != schedule_fingerprint(schedules[team]):
+                before = set(schedules[team]["event_name"])
+                after = set(schedule["event_name"])
+                print(
+                    f"Schedule change for team {team}: "
+                    f"removed {sorted(before - after) or '-'}, "
+                    f"added {sorted(after - before) or '-'}"
+                )
+            schedules[team] = schedule
+            state["teams"][str(team)] = {
+                "checked_event": next_event,
+                "checked_at": now,
+            }
+    else:
+        print("Fixtures are up to date")
+
+    for team, schedule in schedules.items():
+        entry = state["teams"].setdefault(
+            str(team), {"checked_event": next_event, "checked_at": now}
+        )
+        entry["fingerprint"] = schedule_fingerprint(schedule)
+        entry["fixtures"] = schedule.values.tolist()
+
+    team_fixtures = pd.concat(
+        [s.assign(team=t) for t, s in schedules.items()]
+        or [pd.DataFrame(columns=TEAM_FIXTURE_COLS + ["team"])],
+        ignore_index=True,
+    )
+    fixture_info = clean_fixture_info(expand_to_players(player_info, team_fixtures))
+    fixture_info.to_csv(fixture_path, index=False)
+    with open(state_path, "w") as f:
+        json.dump(state, f)
+    return fixture_info
+
+
+def event_order(event_names):
+    parts = pd.Series(event_names).str.extract(r"(\d+)\D+(\d+)").astype(int)
+    return parts[0].to_numpy(), parts[1].to_numpy()
+
+
+def read_fixtures(first_gd, first_gw, final_gw, final_gd, fixture_path=FIXTURE_FILE):
+    """Fixtures between two gamedays as one row per player game.
+
+    Returns a dict of parallel arrays - player_row (into ids), day_index (into
+    days), opp_team (team id) and is_home - plus ids, the players with at
+    least one game, and days, the event names in gameweek/day order. Use
+    to_wide to lay per-game values out as one column per gameday.
+    """
+    fixtures = pd.read_csv(
+        fixture_path, dtype={"event_name": "category", "location": "category"}
+    )
+    events = fixtures["event_name"].cat.categories
+    gameweek, gameday = event_order(events)
+    in_window = (
+        (gameweek >= first_gw)
+        & (gameweek <= final_gw)
+        & ((gameweek > first_gw) | (gameday >= first_gd))
+        & ((gameweek < final_gw) | (gameday <= final_gd))
+    )
+    team_ids = pd.read_csv(DATA_DIR / "team_ids.csv", encoding="utf-8-sig")
+    codes = fixtures["event_name"].cat.codes.to_numpy()
+    fixtures = fixtures[
+        in_window[codes] & fixtures["opp_team"].isin(team_ids["team_id"]).to_numpy()
+    ]
+
+    # days keep only the events somebody plays on, like the old pivot columns
+    day_codes = np.unique(fixtures["event_name"].cat.codes.to_numpy())
+    day_codes = day_codes[np.lexsort((gameday[day_codes], gameweek[day_codes]))]
+    day_lookup = np.full(len(events), -1, dtype=np.int16)
+    day_lookup[day_codes] = np.arange(len(day_codes))
+
+    ids, player_row = np.unique(fixtures["id"].to_numpy(), return_inverse=True)
+    return {
+        "ids": ids,
+        "days": [events[c] for c in day_codes],
+        "player_row": player_row.astype(np.int32),
+        "day_index": day_lookup[fixtures["event_name"].cat.codes.to_numpy()],
+        "opp_team": fixtures["opp_team"].to_numpy(dtype=np.int16),
+        "is_home": (fixtures["location"] == "home").to_numpy(),
+    }
+
+
+def game_rows(fixtures, ids):
+    """Row of each fixture's player in ids, -1 for players not in it."""
+    return pd.Index(ids).get_indexer(fixtures["ids"])[fixtures["player_row"]]
+
+
+def to_wide(fixtures, rows, values, n_rows):
+    """(n_rows x days) matrix of per-game values, 0 where there is no game."""
+    wide = np.zeros((n_rows, len(fixtures["days"])), dtype=np.asarray(values).dtype)
+    keep = rows >= 0
+    wide[rows[keep], fixtures["day_index"][keep]] = np.asarray(values)[keep]
+    return wide
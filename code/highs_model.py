@@ -0,0 +1,315 @@
+"""In-memory HiGHS model for nba_solver.
+
+build_model lays out the same model as the sasoptpy builder directly as NumPy
+arrays: column bounds, integrality, objective and a row-wise (CSR) constraint
+matrix, which pass_model hands to highspy without writing an MPS file.
+Columns follow the sasoptpy model's order, a penalised transfer count per
+week and then squad, team, captain and transfer binaries for every player and
+day, so a solution is read the same way whichever builder made it.
+Single-variable constraints (locked, banned, booked, no transfers on chip
+days) become column bounds rather than rows. Chips the solver places itself
+add a binary per day and kind after those, then, for All-Star, each player's
+bench and lineup share of the day.
+"""
+
+import highspy
+import numpy as np
+
+KINDS = ["squad", "team", "cap", "transfer"]
+
+
+def column(num_weeks, num_days, kind, player, day):
+    """Index of a player-day variable, by player and day position."""
+    return num_weeks + (player * num_days + day) * len(KINDS) + KINDS.index(kind)
+
+
+def chip_columns(num_weeks, num_players, num_days, chips):
+    """Per-day chip columns of each kind in chips, after the player-day ones."""
+    start = num_weeks + len(KINDS) * num_players * num_days
+    return {
+        kind: start + k * num_days + np.arange(num_days) for k, kind in enumerate(chips)
+    }
+
+
+def add_rows(rows, cols, coefs, lower, upper):
+    """Append one row per line of cols (rows x terms), coefs broadcast to it."""
+    cols = np.asarray(cols, dtype=np.int32)
+    cols = cols.reshape(1, -1) if cols.ndim == 1 else cols
+    rows["index"].append(cols.ravel())
+    rows["value"].append(np.broadcast_to(coefs, cols.shape).astype(float).ravel())
+    rows["length"].append(np.full(len(cols), cols.shape[1]))
+    rows["lower"].append(np.broadcast_to(np.asarray(lower, float), len(cols)))
+    rows["upper"].append(np.broadcast_to(np.asarray(upper, float), len(cols)))
+
+
+def fix(lower, upper, cols, value):
+    lower[cols] = np.maximum(lower[cols], value)
+    upper[cols] = np.minimum(upper[cols], value)
+
+
+def build_model(
+    points,
+    cap_points,
+    idle,
+    cost,
+    pos1,
+    team,
+    player_ids,
+    week_day_dict,
+    decay_dict,
+    penalty_dict,
+    as_returns,
+    previous,
+    no_transfer,
+    booked_squad,
+    in_team,
+    locked,
+    gd_banned,
+    use_wc,
+    use_as,
+    day_solve,
+    cap_used,
+    money,
+    transfers_left,
+    hit_cost,
+    weekly_hit_limit,
+    current_week,
+    current_day,
+    team_limit,
+    chip_limits=None,
+    chip_returns=None,
+):
+    """Model arrays for nba_solver.
+
+    points, cap_points (a captain's extra points) and idle are (player x day)
+    in day order; idle players' team and captain columns and every transfer
+    column on no_transfer days are fixed at 0 and left out of the rows that
+    would only restate that. chip_limits caps how many chips of each kind the
+    model may place on days without one; chip_returns holds the (before,
+    after) squads an All-Star placed on a day ties, as for as_returns.
+    """
+    days = [(w, d) for w in week_day_dict for d in week_day_dict[w]]
+    day_index = {day: t for t, day in enumerate(days)}
+    weeks = list(week_day_dict)
+    num_players, num_days, num_weeks = len(player_ids), len(days), len(weeks)
+    points = np.asarray(points, dtype=float).reshape(num_players, num_days)
+    cap_points = np.asarray(cap_points, dtype=float).reshape(num_players, num_days)
+    idle = np.asarray(idle, dtype=bool).reshape(num_players, num_days)
+    cost = np.asarray(cost, dtype=float)
+    pos1 = np.asarray(pos1, dtype=bool)
+    team = np.asarray(team)
+    player_ids = np.asarray(player_ids)
+    player_index = {i: p for p, i in enumerate(player_ids)}
+    in_team = np.isin(player_ids, list(in_team))
+
+    squad = num_weeks + len(KINDS) * (
+        np.arange(num_players)[:, None] * num_days + np.arange(num_days)
+    )
+    team_cols, cap, transfer = squad + 1, squad + 2, squad + 3
+    chip_limits = {k: v for k, v in (chip_limits or {}).items() if v > 0}
+    chip = chip_columns(num_weeks, num_players, num_days, list(chip_limits))
+    num_cols = num_weeks + len(KINDS) * num_players * num_days
+    num_cols += len(chip) * num_days
+    if "as" in chip:
+        as_bench = num_cols + np.arange(num_players * num_days).reshape(
+            num_players, num_days
+        )
+        as_team = as_bench + num_players * num_days
+        num_cols += 2 * num_players * num_days
+
+    col_cost = np.zeros(num_cols)
+    col_lower = np.zeros(num_cols)
+    col_upper = np.ones(num_cols)
+    col_upper[:num_weeks] = np.inf
+    rows = {"index": [], "value": [], "length": [], "lower": [], "upper": []}
+
+    decay = np.array([decay_dict[a][b] for a, b in days])
+    is_as = np.array([f"{a}_{b}" in use_as for a, b in days], dtype=bool)
+    is_wc = np.array([f"{a}_{b}" in use_wc for a, b in days], dtype=bool)
+    no_cap = idle | (is_as | is_wc)
+    col_upper[team_cols[idle]] = 0
+    col_upper[cap[no_cap]] = 0
+    if not day_solve:
+        col_upper[transfer[:, no_transfer]] = 0
+    # with idle starters fixed a lineup may have fewer than five and the
+    # weekly captain may go unused, neither of which costs points while EV >= 0
+    relax = idle.any()
+    # a placed chip goes on a day transfers are otherwise made on
+    for kind in chip:
+        col_upper[chip[kind][no_transfer]] = 0
+    if "as" in chip:
+        # bench / lineup share of an All-Star day, only worth having with EV
+        has_as = (points > 0) & ~no_transfer
+        col_upper[as_bench[~has_as]] = 0
+        col_upper[as_team[~has_as]] = 0
+    # transfers are free on a chip day and on the day an All-Star squad returns
+    free = [[chip[kind][t] for kind in chip] for t in range(num_days)]
+    for day, (before, after) in (chip_returns or {}).items():
+        free[day_index[after]].append(chip["as"][day_index[day]])
+
+    # objective, minimised as negative points like the sasoptpy model
+    if day_solve:
+        col_cost[team_cols] = -points
+    else:
+        col_cost[team_cols] = -points * np.where(is_as, 0.95, 1) * decay
+        col_cost[squad] = -points * np.where(is_as, 0.05, 0) * decay
+        col_cost[cap] = -cap_points * np.where(is_as, 0, 1) * decay
+        penalty = np.array([penalty_dict.get(a, {}).get(b, 0) for a, b in days])
+        col_cost[transfer] = penalty * decay
+        col_cost[:num_weeks] = [
+            hit_cost * decay_dict[w][min(week_day_dict[w])] for w in weeks
+        ]
+        if "as" in chip:
+            col_cost[as_bench] = -points * 0.05 * decay
+            col_cost[as_team] = points * 0.05 * decay
+
+    # post allstar team reset
+    for before, after in as_returns:
+        t_after = day_index[after]
+        if before is None:
+            fix(col_lower, col_upper, squad[:, t_after], in_team)
+        else:
+            pair = np.stack([squad[:, t_after], squad[:, day_index[before]]], axis=1)
+            add_rows(rows, pair, [1, -1], 0, 0)
+
+    # placed chips: how many, one a day, no captain, and for All-Star the
+    # bench / lineup shares and the squad returning the day after
+    for kind in chip:
+        add_rows(rows, chip[kind], 1, -np.inf, chip_limits[kind])
+    if len(chip) > 1:
+        add_rows(rows, np.stack(list(chip.values()), axis=1), 1, -np.inf, 1)
+    if chip:
+        add_rows(rows, np.column_stack([cap.T, *chip.values()]), 1, -np.inf, 1)
+    if "as" in chip:
+        as_day = np.broadcast_to(chip["as"], squad.shape)
+        pairs = np.stack([as_bench[has_as], squad[has_as]], axis=1)
+        add_rows(rows, pairs, [1, -1], -np.inf, 0)
+        pairs = np.stack([as_bench[has_as], as_day[has_as]], axis=1)
+        add_rows(rows, pairs, [1, -1], -np.inf, 0)
+        triple = np.stack([as_team[has_as], team_cols[has_as], as_day[has_as]], axis=1)
+        add_rows(rows, triple, [1, -1, -1], -1, np.inf)
+        for day, (before, after) in (chip_returns or {}).items():
+            t, t_after = day_index[day], day_index[after]
+            placed = np.full(num_players, chip["as"][t])
+            if before is None:
+                pair = np.stack([squad[:, t_after], placed], axis=1)
+                add_rows(rows, pair, [1, 1], -np.inf, 1 + in_team)
+                add_rows(rows, pair, [1, -1], in_team - 1.0, np.inf)
+            else:
+                triple = np.stack(
+                    [squad[:, t_after], squad[:, day_index[before]], placed], axis=1
+                )
+                add_rows(rows, triple, [1, -1, 1], -np.inf, 1)
+                add_rows(rows, triple, [1, -1, -1], -1, np.inf)
+
+    for w, a in enumerate(weeks):
+        week_days = [day_index[a, b] for b in week_day_dict[a]]
+        captains = 0 if cap_used and a == current_week else 1
+        add_rows(rows, cap[:, week_days].ravel(), 1, 0 if relax else captains, captains)
+
+    add_rows(rows, squad.T, 1, 10, 10)
+    if relax:
+        add_rows(rows, team_cols.T, 1, -np.inf, 5)
+        add_rows(rows, team_cols[pos1].T, 1, -np.inf, 3)
+        add_rows(rows, team_cols[~pos1].T, 1, -np.inf, 3)
+    else:
+        add_rows(rows, team_cols.T, 1, 5, 5)
+        add_rows(rows, team_cols[pos1].T, 1, 2, 3)
+    add_rows(rows, squad[pos1].T, 1, 5, 5)
+    if not day_solve and "as" in chip:
+        # an All-Star day lifts the budget by more than any squad costs
+        lift = np.sort(cost)[-10:].sum()
+        cols = np.column_stack([squad[:, ~is_as].T, chip["as"][~is_as]])
+        add_rows(rows, cols, np.append(cost, -lift), -np.inf, money)
+    elif not day_solve:
+        add_rows(rows, squad[:, ~is_as].T, cost, -np.inf, money)
+    for k in np.unique(team):
+        add_rows(rows, squad[team == k].T, 1, -np.inf, team_limit)
+    pairs = np.stack([team_cols[~idle], squad[~idle]], axis=1)
+    add_rows(rows, pairs, [1, -1], -np.inf, 0)
+    pairs = np.stack([cap[~no_cap], team_cols[~no_cap]], axis=1)
+    add_rows(rows, pairs, [1, -1], -np.inf, 0)
+
+    # transfers
+    if not day_solve:
+        for t, (a, b) in enumerate(days):
+            prev = previous[a, b]
+            if no_transfer[t]:
+                continue
+            extra = np.broadcast_to(free[t], (num_players, len(free[t])))
+            ones = [1] * len(free[t])
+            if prev[0] == -1:
+                cols = np.column_stack([transfer[:, t], squad[:, t], extra])
+                lower = -in_team.astype(float)
+                add_rows(rows, cols, [1, -1, *ones], lower, np.inf)
+            else:
+                cols = np.column_stack(
+                    [transfer[:, t], squad[:, t], squad[:, day_index[prev]], extra]
+                )
+                add_rows(rows, cols, [1, -1, 1, *ones], 0, np.inf)
+
+        for w, a in enumerate(weeks):
+            week_days = [day_index[a, b] for b in week_day_dict[a]]
+            limit = transfers_left if a == current_week else 2
+            cols = np.concatenate([[w], transfer[:, week_days].ravel()])
+            coefs = np.where(np.arange(len(cols)) == 0, 1, -1)
+            add_rows(rows, cols, coefs, -limit, np.inf)
+
+        if weekly_hit_limit is not None and str(weekly_hit_limit).strip() != "":
+            col_upper[:num_weeks] = int(weekly_hit_limit)
+
+    fix(col_lower, col_upper, squad[np.isin(player_ids, list(locked))], 1)
+
+    first = day_index[current_week, current_day]
+    first_day_str = f"{current_week}_{current_day}"
+    if first_day_str not in use_wc and first_day_str not in use_as and not day_solve:
+        if weekly_hit_limit is not None and str(weekly_hit_limit).strip() != "":
+            max_hits_allowed = int(weekly_hit_limit)
+        else:
+            max_hits_allowed = 10
+        min_players_to_keep = max(0, 10 - transfers_left - max_hits_allowed)
+        cols = np.concatenate([squad[in_team, first], free[first]])
+        coefs = np.where(np.isin(cols, free[first]), min_players_to_keep, 1)
+        add_rows(rows, cols, coefs, min_players_to_keep, np.inf)
+
+    banned_today = np.isin(player_ids, list(gd_banned))
+    fix(col_lower, col_upper, squad[banned_today, first], 0)
+
+    for i, a, b, value in booked_squad:
+        fix(col_lower, col_upper, squad[player_index[i], day_index[a, b]], value)
+
+    length = np.concatenate(rows["length"])
+    return {
+        "num_weeks": num_weeks,
+        "num_days": num_days,
+        "col_cost": col_cost,
+        "col_lower": col_lower,
+        "col_upper": col_upper,
+        "row_lower": np.concatenate(rows["lower"]),
+        "row_upper": np.concatenate(rows["upper"]),
+        "start": np.concatenate([[0], np.cumsum(length)]).astype(np.int32),
+        "index": np.concatenate(rows["index"]).astype(np.int32),
+        "value": np.concatenate(rows["value"]),
+    }
+
+
+def pass_model(solver_instance, model):
+    """Load a build_model model into a highspy.Highs instance."""
+    num_cols, num_rows = len(model["col_cost"]), len(model["row_lower"])
+    solver_instance.passModel(
+        num_cols,
+        num_rows,
+        len(model["index"]),
+        int(highspy.MatrixFormat.kRowwise),
+        int(highspy.ObjSense.kMinimize),
+        0.0,
+        model["col_cost"],
+        model["col_lower"],
+        model["col_upper"],
+        model["row_lower"],
+        model["row_upper"],
+        model["start"][:-1],
+        model["index"],
+        model["value"],
+        np.full(num_cols, int(highspy.HighsVarType.kInteger), dtype=np.int32),
+    )
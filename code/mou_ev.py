@@ -7,21 +7,23 @@ NBA Projections based on data from Dunks and Threes EPM
 
 # %% imports
 import pandas as pd
+import numpy as np
 
 import requests
-from bs4 import BeautifulSoup
 import re
-import ast
+import json
+from io import StringIO
 import urllib3
+import warnings
 from pathlib import Path
 
+from ev_store import save_ev
+from fetch import API_BASE, fetch_json_many, get_json, get_text
+from names import build_name_index, fold_accents, resolve_names, update_crosswalk
+
 root = Path(__file__).parent.parent
 output_dir = root / "data"
 
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-pd.set_option("mode.chained_assignment", None)
-
 gws_to_run = [
     17,
     18,
@@ -32,9 +34,7 @@ gws_to_run = [
 
 # %% functions
 def get_player_info():
-    url = "https://nbafantasy.nba.com/api/bootstrap-static/"
-    r = requests.get(url, verify=False)
-    json = r.json()
+    json = get_json(f"{API_BASE}bootstrap-static/", verify=False)
     elements = pd.DataFrame(json["elements"])
     elements["name"] = elements["first_name"] + " " + elements["second_name"]
     teams = pd.DataFrame(json["teams"])
@@ -45,16 +45,14 @@ def get_player_info():
 
 
 def get_fixture_info(player_info):
+    urls = [f"{API_BASE}element-summary/{i}/" for i in player_info["id"]]
     fixtures = []
 
-    for i in player_info["id"]:
-        url = "https://nbafantasy.nba.com/api/element-summary/" + str(i) + "/"
-        r = requests.get(url, verify=False)
-        json = r.json()
-        if json == {"detail": "Not found."}:
+    for i, summary in zip(player_info["id"], fetch_json_many(urls, verify=False)):
+        if summary == {"detail": "Not found."}:
             continue
         else:
-            data = pd.DataFrame(json["fixtures"])
+            data = pd.DataFrame(summary["fixtures"])
             data["id"] = i
             data = data[["team_h", "team_a", "event_name", "is_home", "id"]]
             fixtures.append(data)
@@ -64,6 +62,84 @@ def get_fixture_info(player_info):
     return fixtures
 
 
+EPM_SEASON = 2026
+
+EPM_RECORD_START = re.compile(rf"\{{season:{EPM_SEASON},game_dt:")
+EPM_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<key>[A-Za-z_$][\w$]*)\s*:
+        |(?P<string>"(?:[^"\\]|\\.)*")
+        |(?P<number>-?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+        |(?P<literal>null|true|false|void\ 0|undefined)
+        |(?P<punct>[,}])
+        |(?P<nested>[\[{])
+    )""",
+    re.VERBOSE,
+)
+EPM_LITERALS = {"null": None, "true": True, "false": False}
+
+
+def skip_nested(text, pos):
+    """Return the index just past the array/object literal opened at pos - 1."""
+    depth = 1
+    in_string = False
+    while depth and pos < len(text):
+        c = text[pos]
+        if in_string:
+            if c == "\\":
+                pos += 1
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in "[{":
+            depth += 1
+        elif c in "]}":
+            depth -= 1
+        pos += 1
+    return pos
+
+
+def parse_epm_record(text, start):
+    """Parse one JS object literal starting at text[start] ("{").
+
+    Returns (row, end) with numbers, strings, booleans and nulls as Python
+    values (nested arrays/objects are skipped and stored as None), or
+    (None, end) if the record is malformed.
+    """
+    row = {}
+    pos = start + 1
+    key = None
+    while True:
+        m = EPM_TOKEN.match(text, pos)
+        if m is None:
+            return None, pos
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == "nested":
+            if key is None:
+                return None, pos
+            row[key] = None
+            key = None
+            pos = skip_nested(text, pos)
+        elif kind == "key" and key is None:
+            key = m.group("key")
+        elif kind == "punct":
+            if m.group("punct") == "}":
+                return row, pos
+        elif key is None:
+            return None, pos
+        else:
+            token = m.group(kind)
+            if kind == "number":
+                row[key] = int(token) if token.lstrip("-").isdigit() else float(token)
+            elif kind == "string":
+                row[key] = json.loads(token)
+            else:
+                row[key] = EPM_LITERALS.get(token)
+            key = None
+
+
 def extract_epm_data():
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36"
@@ -72,484 +148,430 @@ def extract_epm_data():
     url = "https://dunksandthrees.com/epm"
 
     try:
-        response = requests.get(url, verify=False, headers=headers)
-        response.raise_for_status()  # Raise an exception for bad status codes
+        data = get_text(url, headers=headers, verify=False)
     except requests.exceptions.RequestException as e:
         print(f"Error fetching the URL: {e}")
+        raise
+
+    # one scan over the page, filling columns as each record is parsed
+    columns = {}
+    n_rows = 0
+    for match in EPM_RECORD_START.finditer(data):
+        row, _ = parse_epm_record(data, match.start())
+        if row is None:
+            print(f"Warning: could not parse EPM record at offset {match.start()}")
+            continue
+        for key, value in row.items():
+            if key not in columns:
+                columns[key] = [None] * n_rows
+            columns[key].append(value)
+        n_rows += 1
+        for values in columns.values():
+            if len(values) < n_rows:
+                values.append(None)
 
-    data = response.text
-    soup = BeautifulSoup(data, "html.parser")
-    script_tags = soup.find_all("script")
-    script_contents = []
-
-    for script in script_tags:
-        if script.string:  # Check if the script tag has content
-            script_contents.append(script.string.strip())
-
-    pattern = r"\{season:2026,game_dt.*?\}"
-    matches = re.findall(pattern, data)
-    data_list = [match.strip() for match in matches]
-    return data_list
-
-
-def modify_strings(list_of_s):
-    mod_list = []
-    for s in list_of_s:
-        s = s.replace(",", "," + '"')
-        s = s.replace(":", '"' + ":")
-        s = s.replace("{", '{"')
-        s = s.replace("null", "0")
-        mod_list.append(s)
-    return mod_list
+    # nulls in stat columns count as zero, like the rest of the model expects;
+    # text columns keep them as missing values
+    for key, values in columns.items():
+        if all(v is None or type(v) in (int, float) for v in values):
+            columns[key] = [0 if v is None else v for v in values]
+    return pd.DataFrame(columns)
 
 
-def convert_string_list_to_dict(string_list):
-    """
-    Converts a list of strings, each representing a dictionary-like structure,
-    into a list of actual Python dictionaries.
-    """
-    result_dicts = []
-    for s in string_list:
-        try:
-            # Safely evaluate the string as a Python literal (dictionary)
-            evaluated_dict = ast.literal_eval(s)
-            if isinstance(evaluated_dict, dict):
-                result_dicts.append(evaluated_dict)
-            else:
-                print(f"Warning: '{s}' did not evaluate to a dictionary.")
-        except (ValueError, SyntaxError) as e:
-            print(f"Error evaluating string '{s}': {e}")
-    return result_dicts
+# 0.001 steps tried per team, fewer than 1000 so 1 - 0.001k stays positive
+MINUTES_STEPS = 1000
 
 
 def mins_adjustment(full):
-    adjusted = []
+    """Scale every team's minutes to 240 a game.
+
+    Each team's top 13 players keep p_mp_48 (the rest get 0) and teams
+    outside the 235-245 band are stepped towards it like the old loop did:
+    step k multiplies by (1 +/- 0.001k) ** (rank / 2) and caps at 48, so
+    after n steps a player has min(48, min(48, p_mp_48) * exp(L_n * rank / 2))
+    with L_n the summed log step sizes. Every team's totals over all steps
+    are evaluated at once and the first step inside the band is kept, which
+    is where the old loop stopped. If a step jumps the whole band, where the
+    old loop went on oscillating, the first step past it is kept instead.
+    Teams already inside are left as they are. The minutes are then rescaled
+    to exactly 240.
+    """
+    full = full.copy()
     full["p_mp_48"] *= 1.1
-    for t in full["team_alias"].unique():
-        outfielders = full[full["team_alias"] == t]
-        outfielders = outfielders.sort_values(by="p_mp_48", ascending=False)
-        outfielders["rank"] = list(range(1, len(outfielders) + 1))
-        outfielders.loc[outfielders["rank"] > 13, "p_mp_48"] = 0
-        exp = 1.0
-        while (outfielders["p_mp_48"].sum() <= 235) or (
-            outfielders["p_mp_48"].sum() >= 245
-        ):
-            # print(outfielders['p_mp_48'].sum())
-            if outfielders["p_mp_48"].sum() <= 235:
-                outfielders["p_mp_48"] *= pow(exp, outfielders["rank"] / 2)
-                exp += 0.001
-            elif outfielders["p_mp_48"].sum() >= 245:
-                outfielders["p_mp_48"] *= pow(exp, outfielders["rank"] / 2)
-                exp -= 0.001
-            outfielders["p_mp_48"] = outfielders["p_mp_48"].clip(upper=48)
-        outfielders["p_mp_48"] = (
-            240 * outfielders["p_mp_48"] / outfielders["p_mp_48"].sum()
-        )
-        adjusted.append(outfielders)
-    adjusted = pd.concat(adjusted)
-    return adjusted
+    full = full.sort_values(
+        ["team_alias", "p_mp_48"], ascending=[True, False], kind="stable"
+    )
+    full["rank"] = full.groupby("team_alias").cumcount() + 1
+
+    team, teams = pd.factorize(full["team_alias"])
+    power = full["rank"].to_numpy() / 2
+    minutes = np.where(full["rank"] > 13, 0.0, full["p_mp_48"].to_numpy())
+
+    start = np.bincount(team, minutes, minlength=len(teams))
+    up, down = start <= 235, start >= 245
+    steps = 0.001 * np.arange(MINUTES_STEPS)
+    log_steps = np.where(
+        up[:, None],
+        np.cumsum(np.log1p(steps)),
+        np.where(down[:, None], np.cumsum(np.log1p(-steps)), 0.0),
+    )
+    # (player x step) minutes; the log is capped where every total has
+    # long since crossed the band so exp can't overflow
+    scaled = np.minimum(
+        48,
+        np.minimum(minutes, 48)[:, None]
+        * np.exp(np.clip(log_steps[team], -40, 40) * power[:, None]),
+    )
+    # rows are sorted by team, so each team's players are one block
+    first_rows = np.flatnonzero(np.r_[True, team[1:] != team[:-1]])
+    totals = np.add.reduceat(scaled, first_rows, axis=0)
+    crossed = np.where(up[:, None], totals > 235, totals < 245)
+    step = np.where(crossed.any(axis=1), crossed.argmax(axis=1), MINUTES_STEPS - 1)
+
+    minutes = np.where(
+        (up | down)[team], scaled[np.arange(len(team)), step[team]], minutes
+    )
+    total = np.bincount(team, minutes, minlength=len(teams))[team]
+    full["p_mp_48"] = np.where(total > 0, 240 * minutes / np.maximum(total, 1e-9), 0)
+    return full
 
 
 def injury_status():
-    injuries = pd.read_html("https://sports.yahoo.com/nba/injuries/")
+    injuries = pd.read_html(
+        StringIO(get_text("https://sports.yahoo.com/nba/injuries/"))
+    )
     injuries = pd.concat(injuries)
     injuries = injuries[["Player", "Pos", "Status", "Date"]]
     injuries = injuries.dropna()
-    injuries["Player"] = injuries["Player"].str.replace("í", "i")
-    injuries["Player"] = injuries["Player"].str.replace("č", "c")
-    injuries["Player"] = injuries["Player"].str.replace("Č", "C")
-    injuries["Player"] = injuries["Player"].str.replace("ić", "ic")
-    injuries["Player"] = injuries["Player"].str.replace("ö", "o")
-    injuries["Player"] = injuries["Player"].str.replace("é", "e")
-    injuries["Player"] = injuries["Player"].str.replace("ü", "u")
-    injuries["Player"] = injuries["Player"].str.replace("ņ", "n")
-    injuries["Player"] = injuries["Player"].str.replace("ģ", "g")
-    injuries["Player"] = injuries["Player"].str.replace("ô", "o")
-    injuries["Player"] = injuries["Player"].str.replace("ū", "u")
-    injuries["Player"] = injuries["Player"].str.replace("Ş", "S")
-    injuries["Player"] = injuries["Player"].str.replace("Š", "S")
-    injuries["Player"] = injuries["Player"].str.replace("è", "e")
-    # injuries['Player'] = injuries['Player'].str.replace('P.J. Washington Jr.','P.J. Washington')
-    # injuries['Player'] = injuries['Player'].str.replace('GG Jackson II','GG Jackson')
-    # injuries['Player'] = injuries['Player'].str.replace('Xavier Tillman Sr.','Xavier Tillman')
-    # injuries['Player'] = injuries['Player'].str.replace('Jeff Dowtin Jr.','Jeff Dowtin')
-    # injuries['Player'] = injuries['Player'].str.replace('Craig Porter Jr.','Craig Porter')
-    # injuries['Player'] = injuries['Player'].str.replace('Ron Holland II','Ronald Holland II')
-    # injuries['Player'] = injuries['Player'].str.replace('Tolu Smith III','Tolu Smith')
-    # injuries['Player'] = injuries['Player'].str.replace('Trey Jemison III','Trey Jemison')
-    # injuries['Player'] = injuries['Player'].str.replace('AJ Green','A.J. Green')
-    # injuries['Player'] = injuries['Player'].str.replace('KJ Simpson','K.J. Simpson')
-    # injuries['Player'] = injuries['Player'].str.replace('KJ Martin','Kenyon Martin Jr.')
     return injuries
 
 
-def matchup_stats(home, away, matchup, team):
-    # print()
-    game_pace = (
-        matchup.loc[matchup["team_alias"] == home, "adj_pace"].values[0]
-        + matchup.loc[matchup["team_alias"] == away, "adj_pace"].values[0]
-    ) / 2
-    """
-    playoffs = 0
-    league_avg_stats = pd.read_html('https://www.basketball-reference.com/leagues/NBA_stats_per_game.html')
-    if(playoffs == 1): c_season = league_avg_stats[1]
-    else: c_season = league_avg_stats[0]
-    c_season.columns = c_season.columns.droplevel(0)
-    c_season = c_season.dropna()
-    c_season = c_season.loc[c_season['Rk']!='Rk']
-    #c_season = c_season.apply(pd.to_numeric,errors='ignore') #deprecated
-    c_season = c_season.apply(lambda x: pd.to_numeric(x, errors='ignore'))
-    c_season['weight'] = np.exp(-c_season['Rk']) * c_season['G']
-    league_pace = sum(c_season['weight']*c_season['Pace'])/sum(c_season['weight'])
-    #league_avg_ortg = sum(c_season['weight']*c_season['ORtg'])/sum(c_season['weight'])
-    """
-    game_pace *= (
-        99 / matchup["adj_pace"].mean()
-    )  # 99 for regular season, 95 for the playoffs
-    league_avg_ortg = 115  # 115 regular season, 113 playoffs
+LEAGUE_PACE = 99  # 99 for regular season, 95 for the playoffs
+LEAGUE_AVG_ORTG = 115  # 115 regular season, 113 playoffs
+HOME_ADVANTAGE = 2.5  # points
+STATS_100 = {
+    "pts": "p_pts_100",
+    "ast": "p_ast_100",
+    "tov": "p_tov_100",
+    "orb": "p_orb_100",
+    "drb": "p_drb_100",
+    "stl": "p_stl_100",
+    "blk": "p_blk_100",
+}
 
-    home_pace_factor = (
-        game_pace / matchup.loc[matchup["team_alias"] == home, "adj_pace"].values[0]
-    )
-    away_pace_factor = (
-        game_pace / matchup.loc[matchup["team_alias"] == away, "adj_pace"].values[0]
-    )
 
-    # team = df_adj.copy()
-    team = team[(team["team_alias"] == home) | (team["team_alias"] == away)]
-    team.loc[team["team_alias"] == home, "pace factor"] = home_pace_factor
-    team.loc[team["team_alias"] == away, "pace factor"] = away_pace_factor
-
-    home_usage = (
-        team.loc[team["team_alias"] == home, "p_usg"]
-        * team.loc[team["team_alias"] == home, "p_mp_48"]
-        / 48
-    ).sum()
-    team.loc[team["team_alias"] == home, "factor"] = 1 / home_usage
-    away_usage = (
-        team.loc[team["team_alias"] == away, "p_usg"]
-        * team.loc[team["team_alias"] == away, "p_mp_48"]
-        / 48
-    ).sum()
-    team.loc[team["team_alias"] == away, "factor"] = 1 / away_usage
-
-    team["pts"] = (
-        team["p_pts_100"]
-        * (team["p_t_poss_48"] / 100)
-        * (team["p_mp_48"] / 48)
-        * team["factor"]
-        * team["pace factor"]
-    )
-    team["ast"] = (
-        team["p_ast_100"]
-        * (team["p_t_poss_48"] / 100)
-        * (team["p_mp_48"] / 48)
-        * team["factor"]
-        * team["pace factor"]
-    )
-    team["tov"] = (
-        team["p_tov_100"]
-        * (team["p_t_poss_48"] / 100)
-        * (team["p_mp_48"] / 48)
-        * team["factor"]
-        * team["pace factor"]
+def matchup_stats(games, matchup, players):
+    """Project every player's stat line in every game at once.
+
+    games has home and away team aliases (plus any columns to carry along,
+    e.g. week/day), matchup the team strengths and players the minutes
+    adjusted EPM data. Returns one row per player per game and the projected
+    score of each game.
+    """
+    strength = matchup.set_index("team_alias")
+    home = strength.loc[games["home"]].reset_index(drop=True)
+    away = strength.loc[games["away"]].reset_index(drop=True)
+    game_pace = (home["adj_pace"] + away["adj_pace"]) / 2
+    game_pace *= LEAGUE_PACE / matchup["adj_pace"].mean()
+    exp_home_pts = (LEAGUE_AVG_ORTG + home["adj_off"] - away["adj_def"]) * (
+        game_pace / 100
+    ) + HOME_ADVANTAGE / 2
+    exp_away_pts = (LEAGUE_AVG_ORTG + away["adj_off"] - home["adj_def"]) * (
+        game_pace / 100
+    ) - HOME_ADVANTAGE / 2
+
+    # per-game lines at league pace, each team's usage normalised to 1
+    lines = players[
+        ["player_id", "player_name", "team_alias", "injury", "p_mp_48"]
+    ].copy()
+    share = players["p_mp_48"] / 48
+    usage = (players["p_usg"] * share).groupby(players["team_alias"]).transform("sum")
+    per_game = players["p_t_poss_48"] / 100 * share / usage
+    for stat, col in STATS_100.items():
+        lines[stat] = players[col] * per_game
+    team_pts = lines.groupby("team_alias")["pts"].sum()
+
+    # one row per team per game, scaled by pace and then to the expected score
+    carried = games.drop(columns=["home", "away"])
+    sides = pd.concat(
+        [
+            carried.assign(
+                game=games.index,
+                team_alias=games["home"].to_numpy(),
+                opponent=games["away"].to_numpy(),
+                pace_factor=(game_pace / home["adj_pace"]).to_numpy(),
+                expected=exp_home_pts.to_numpy(),
+            ),
+            carried.assign(
+                game=games.index,
+                team_alias=games["away"].to_numpy(),
+                opponent=games["home"].to_numpy(),
+                pace_factor=(game_pace / away["adj_pace"]).to_numpy(),
+                expected=exp_away_pts.to_numpy(),
+            ),
+        ],
+        ignore_index=True,
     )
-    team["orb"] = (
-        team["p_orb_100"]
-        * (team["p_t_poss_48"] / 100)
-        * (team["p_mp_48"] / 48)
-        * team["factor"]
-        * team["pace factor"]
+    paced_pts = sides["pace_factor"] * sides["team_alias"].map(team_pts)
+    sides["scale"] = sides["pace_factor"] * sides["expected"] / paced_pts
+
+    game_stats = sides.merge(lines, on="team_alias")
+    for stat in STATS_100:
+        game_stats[stat] *= game_stats["scale"]
+    game_stats["EV"] = (
+        game_stats["pts"]
+        + game_stats["orb"]
+        + game_stats["drb"]
+        + 2 * game_stats["ast"]
+        + 3 * game_stats["blk"]
+        + 3 * game_stats["stl"]
     )
-    team["drb"] = (
-        team["p_drb_100"]
-        * (team["p_t_poss_48"] / 100)
-        * (team["p_mp_48"] / 48)
-        * team["factor"]
-        * team["pace factor"]
+
+    scores = game_stats.groupby(["game", "team_alias"])["pts"].sum().round(2)
+    results = pd.DataFrame(
+        {
+            "Home": games["home"],
+            "home pts": scores.loc[list(zip(games.index, games["home"]))].to_numpy(),
+            "away pts": scores.loc[list(zip(games.index, games["away"]))].to_numpy(),
+            "Away": games["away"],
+        }
     )
-    team["stl"] = (
-        team["p_stl_100"]
-        * (team["p_t_poss_48"] / 100)
-        * (team["p_mp_48"] / 48)
-        * team["factor"]
-        * team["pace factor"]
+    columns = list(lines.columns[:3]) + ["opponent"] + list(lines.columns[3:])
+    columns += ["EV"] + list(carried.columns)
+    return game_stats[columns], results
+
+
+# %% projection
+def home_games(fixtures, player_info, gameweeks, teams):
+    """Home games in the given gameweeks as home/away aliases plus week/day.
+
+    fixtures can be the per-team fixtures from get_fixture_info (team_h,
+    team_a, event_name, is_home) or the per-player fixtures run_solve keeps in
+    fixtures.csv (id, event_name, location, opp_team).
+    """
+    if "team_h" not in fixtures.columns:
+        fixtures = fixtures.merge(player_info[["id", "team"]], on="id")
+        fixtures = fixtures[fixtures["location"] == "home"]
+        fixtures = fixtures.assign(
+            team_h=fixtures["team"], team_a=fixtures["opp_team"], is_home=True
+        )
+    games = fixtures[fixtures["is_home"].astype(bool)]
+    games = games.drop_duplicates(["team_h", "event_name"])
+    event = games["event_name"].str.extract(r"Gameweek (\d+) - Day (\d+)")
+    games = games.assign(week=event[0], day=event[1])
+    games = games[games["week"].isin([str(gw) for gw in gameweeks])]
+
+    alias = teams.set_index("id")["short_name"]
+    games = pd.DataFrame(
+        {
+            "home": games["team_h"].map(alias).to_numpy(),
+            "away": games["team_a"].map(alias).to_numpy(),
+            "week": games["week"].to_numpy(),
+            "day": games["day"].to_numpy(),
+        }
     )
-    team["blk"] = (
-        team["p_blk_100"]
-        * (team["p_t_poss_48"] / 100)
-        * (team["p_mp_48"] / 48)
-        * team["factor"]
-        * team["pace factor"]
+    games["week_num"] = pd.to_numeric(games["week"])
+    games["day_num"] = pd.to_numeric(games["day"])
+    return games
+
+
+def injuries():
+    injury_report = injury_status()
+    injury_report[["Status", "Type"]] = injury_report["Status"].str.split(
+        "(", expand=True
     )
+    injury_report["Type"] = injury_report["Type"].str.replace(")", "")
+    injury_report = injury_report[injury_report["Type"] != "Rest"]
+    injury_report["injury"] = 0.0
+    injury_report.loc[injury_report["Status"] == "Day-To-Day ", "injury"] = 0.75
+    return injury_report
 
-    rating_adj = 2.5  # + matchup.loc[matchup['team_alias']==home,'rating'].values[0] - matchup.loc[matchup['team_alias']==away,'rating'].values[0]
 
-    home_pts = team.loc[team["team_alias"] == home, "pts"].sum()
-    exp_home_pts = (
-        (
-            league_avg_ortg
-            + matchup.loc[matchup["team_alias"] == home, "adj_off"].values[0]
-            - matchup.loc[matchup["team_alias"] == away, "adj_def"].values[0]
-        )
-        * (game_pace / 100)
-    ) + rating_adj / 2
-    away_pts = team.loc[team["team_alias"] == away, "pts"].sum()
-    exp_away_pts = (
-        (
-            league_avg_ortg
-            + matchup.loc[matchup["team_alias"] == away, "adj_off"].values[0]
-            - matchup.loc[matchup["team_alias"] == home, "adj_def"].values[0]
-        )
-        * (game_pace / 100)
-    ) - rating_adj / 2
-    home_adj = (
-        exp_home_pts / home_pts
-    )  # (home_pts + (rating_adj - (home_pts - away_pts))/2)/home_pts
-    away_adj = (
-        exp_away_pts / away_pts
-    )  # (away_pts - (rating_adj - (home_pts - away_pts))/2)/away_pts
-
-    team.loc[team["team_alias"] == home, "pts"] *= home_adj
-    team.loc[team["team_alias"] == home, "ast"] *= home_adj
-    team.loc[team["team_alias"] == home, "tov"] *= home_adj
-    team.loc[team["team_alias"] == home, "orb"] *= home_adj
-    team.loc[team["team_alias"] == home, "drb"] *= home_adj
-    team.loc[team["team_alias"] == home, "stl"] *= home_adj
-    team.loc[team["team_alias"] == home, "blk"] *= home_adj
-    team.loc[team["team_alias"] == home, "opponent"] = away
-    team.loc[team["team_alias"] == away, "pts"] *= away_adj
-    team.loc[team["team_alias"] == away, "ast"] *= away_adj
-    team.loc[team["team_alias"] == away, "tov"] *= away_adj
-    team.loc[team["team_alias"] == away, "orb"] *= away_adj
-    team.loc[team["team_alias"] == away, "drb"] *= away_adj
-    team.loc[team["team_alias"] == away, "stl"] *= away_adj
-    team.loc[team["team_alias"] == away, "blk"] *= away_adj
-    team.loc[team["team_alias"] == away, "opponent"] = home
-
-    team = team[
+def epm_players(player_names):
+    """EPM player data with injuries applied and minutes scaled to 240."""
+    player_data = extract_epm_data()
+    injury_report = injuries()
+
+    player_data = player_data[
         [
+            "season",
+            "game_dt",
             "player_id",
             "player_name",
+            "team_id",
             "team_alias",
-            "opponent",
-            "injury",
+            "age",
+            "inches",
+            "weight",
+            "rookie_year",
+            "position",
+            "off",
+            "def",
+            "tot",
+            "p_pct_start",
+            "p_t_poss_48",
             "p_mp_48",
-            "pts",
-            "ast",
-            "tov",
-            "orb",
-            "drb",
-            "stl",
-            "blk",
+            "p_usg",
+            "p_pts_100",
+            "p_tspct",
+            "p_efg",
+            "p_fga_rim_100",
+            "p_fga_mid_100",
+            "p_fg2a_100",
+            "p_fg3a_100",
+            "p_fta_100",
+            "p_fgpct_rim",
+            "p_fgpct_mid",
+            "p_fg2pct",
+            "p_fg3pct",
+            "p_ftpct",
+            "p_ast_100",
+            "p_tov_100",
+            "p_orb_100",
+            "p_drb_100",
+            "p_stl_100",
+            "p_blk_100",
         ]
     ]
-    team["EV"] = (
-        team["pts"]
-        + team["orb"]
-        + team["drb"]
-        + 2 * team["ast"]
-        + 3 * team["blk"]
-        + 3 * team["stl"]
-    )
-    # print(home, round(team.loc[team["team_alias"] == home, "pts"].sum(), 2))
-    # print(away, round(team.loc[team["team_alias"] == away, "pts"].sum(), 2))
-    return team, [
-        home,
-        round(team.loc[team["team_alias"] == home, "pts"].sum(), 2),
-        round(team.loc[team["team_alias"] == away, "pts"].sum(), 2),
-        away,
-    ]
 
+    player_data["player_name"] = player_data["player_name"].map(
+        fold_accents, na_action="ignore"
+    )
 
-# %% player names
-player_names, team_id = get_player_info()
-player_names = player_names.loc[player_names["code"] > 1]
-player_names = player_names.sort_values(["now_cost", "team"], ascending=[False, True])
-
-# %% fixtures by team
-# team_list = player_names.groupby('team').first()
-# team_list = team_list.reset_index()
-fixtures = get_fixture_info(player_names.groupby("team").first().reset_index())
-fixtures = fixtures.drop("id", axis=1)
-fixtures["event_name"] = fixtures["event_name"].str.replace("Gameweek ", "GD_")
-fixtures["event_name"] = fixtures["event_name"].str.replace(" - Day ", "_")
-fixtures[["event_name", "gameweek", "gameday"]] = fixtures["event_name"].str.split(
-    "_", expand=True
-)
+    # match injuries and fantasy players to EPM players by id
+    epm_index = build_name_index(player_data["player_id"], player_data["player_name"])
+    injury_report["player_id"] = resolve_names(
+        injury_report["Player"], epm_index, "injury"
+    )
+    injury_report = injury_report.dropna(subset=["player_id"])
+    injury_report = injury_report.astype({"player_id": int})
+    injury_report = injury_report.drop_duplicates("player_id")
+
+    code_to_id = player_names.set_index("code")["id"]
+    update_crosswalk(
+        player_names,
+        "epm_name",
+        player_data["player_id"].map(code_to_id),
+        player_data["player_name"],
+    )
+    update_crosswalk(
+        player_names,
+        "injury_name",
+        injury_report["player_id"].map(code_to_id),
+        injury_report["Player"],
+    )
 
-# %% get the fixtures for the given gameweek(s)
-gameweeks_str = [str(gw) for gw in gws_to_run]
+    player_data = player_data.merge(
+        injury_report[["player_id", "injury"]], on="player_id", how="left"
+    )
+    player_data["injury"] = player_data["injury"].fillna(1)
+    player_data["p_mp_48"] *= player_data["injury"]
+    return mins_adjustment(player_data)
 
-gw_fixtures = fixtures[
-    (fixtures["gameweek"].isin(gameweeks_str)) & (fixtures["is_home"])
-]
 
-if gw_fixtures.empty:
-    print(f"No fixtures found for the specified gameweeks: {gws_to_run}.")
-else:
-    print(f"Found {len(gw_fixtures)} fixtures for Gameweeks: {gws_to_run}")
-    gw_fixtures = gw_fixtures[["team_h", "team_a", "gameweek", "gameday"]]
-    gw_fixtures = gw_fixtures.merge(
-        team_id, left_on=["team_h"], right_on=["id"], how="left"
-    )
-    gw_fixtures = gw_fixtures.merge(
-        team_id, left_on=["team_a"], right_on=["id"], how="left"
+def team_strengths(player_data):
+    player_data["adj_off"] = player_data["off"] * player_data["p_mp_48"] / 48
+    player_data["adj_def"] = player_data["def"] * player_data["p_mp_48"] / 48
+    player_data["adj_pace"] = player_data["p_t_poss_48"] * player_data["p_mp_48"] / 240
+    team_strength = player_data.pivot_table(
+        values=["adj_off", "adj_def", "adj_pace"], index=["team_alias"], aggfunc="sum"
     )
+    team_strength["rating"] = team_strength["adj_off"] + team_strength["adj_def"]
+    return team_strength.reset_index()
 
-# %% extract data from dunks and threes
-player_data = extract_epm_data()
-player_data = modify_strings(player_data)
-player_data = convert_string_list_to_dict(player_data)
-
-injury_report = injury_status()
-injury_report[["Status", "Type"]] = injury_report["Status"].str.split("(", expand=True)
-injury_report["Type"] = injury_report["Type"].str.replace(")", "")
-injury_report = injury_report[injury_report["Type"] != "Rest"]
-injury_report["injury"] = 0.0
-injury_report.loc[injury_report["Status"] == "Day-To-Day ", "injury"] = 0.75
-
-player_data = pd.DataFrame(player_data)
-player_data = player_data[
-    [
-        "season",
-        "game_dt",
-        "player_id",
-        "player_name",
-        "team_id",
-        "team_alias",
-        "age",
-        "inches",
-        "weight",
-        "rookie_year",
-        "position",
-        "off",
-        "def",
-        "tot",
-        "p_pct_start",
-        "p_t_poss_48",
-        "p_mp_48",
-        "p_usg",
-        "p_pts_100",
-        "p_tspct",
-        "p_efg",
-        "p_fga_rim_100",
-        "p_fga_mid_100",
-        "p_fg2a_100",
-        "p_fg3a_100",
-        "p_fta_100",
-        "p_fgpct_rim",
-        "p_fgpct_mid",
-        "p_fg2pct",
-        "p_fg3pct",
-        "p_ftpct",
-        "p_ast_100",
-        "p_tov_100",
-        "p_orb_100",
-        "p_drb_100",
-        "p_stl_100",
-        "p_blk_100",
-    ]
-]
 
-player_data["player_name"] = player_data["player_name"].str.replace(
-    "curiÅ¡ic", "Durisic"
-)
-player_data["player_name"] = player_data["player_name"].str.replace("Ä", "c")
-player_data["player_name"] = player_data["player_name"].str.replace("", "")
-player_data["player_name"] = player_data["player_name"].str.replace("Ä", "c")
-player_data["player_name"] = player_data["player_name"].str.replace("Ã±", "n")
-player_data["player_name"] = player_data["player_name"].str.replace("Ã¡", "a")
-player_data["player_name"] = player_data["player_name"].str.replace("Ã¤", "a")
-player_data["player_name"] = player_data["player_name"].str.replace("Ã´", "o")
-player_data["player_name"] = player_data["player_name"].str.replace("Ã«", "e")
-
-# %% adjust player minutes to 240 per team
-player_data = player_data.merge(
-    injury_report[["Player", "injury"]],
-    left_on="player_name",
-    right_on="Player",
-    how="left",
-)
-player_data["injury"] = player_data["injury"].fillna(1)
-player_data["p_mp_48"] *= player_data["injury"]
-player_data = mins_adjustment(player_data)
+def ev_sheet(gw_summary, player_names):
+    """Pivot per-game projections into one EV column per gameday."""
+    gw_summary["gw_day_label"] = (
+        "Gameweek "
+        + gw_summary["week"].astype(str)
+        + " - Day "
+        + gw_summary["day"].astype(str)
+    )
+    label_sort_df = gw_summary[
+        ["gw_day_label", "week_num", "day_num"]
+    ].drop_duplicates()
+    label_sort_df = label_sort_df.sort_values(by=["week_num", "day_num"])
+    sorted_labels = label_sort_df["gw_day_label"].tolist()
+
+    gw_pivot = pd.pivot_table(
+        gw_summary,
+        index=["player_id", "player_name"],
+        columns=["gw_day_label"],
+        values=["EV"],
+    )
+    gw_pivot.columns = gw_pivot.columns.droplevel(0)
+
+    if gw_pivot.columns.nlevels == 1:
+        ev_cols = [label for label in sorted_labels if label in gw_pivot.columns]
+        other_cols = [col for col in gw_pivot.columns if col not in ev_cols]
+        gw_pivot = gw_pivot[other_cols + ev_cols]
+
+    gw_pivot["EV total"] = gw_pivot.sum(axis=1, skipna=True)
+    gw_pivot = gw_pivot.reset_index()
+    gw_pivot = gw_pivot.merge(
+        player_names[["code", "id", "now_cost", "team", "element_type"]],
+        left_on=["player_id"],
+        right_on=["code"],
+        how="left",
+    )
+    gw_pivot = gw_pivot.drop("code", axis=1)
+    gw_pivot["efficiency"] = gw_pivot["EV total"] / gw_pivot["now_cost"]
 
-player_data["adj_off"] = player_data["off"] * player_data["p_mp_48"] / 48
-player_data["adj_def"] = player_data["def"] * player_data["p_mp_48"] / 48
-player_data["adj_pace"] = player_data["p_t_poss_48"] * player_data["p_mp_48"] / 240
+    gw_pivot["id"] = (
+        pd.to_numeric(gw_pivot["id"], errors="coerce").fillna(0).astype(int)
+    )
+    gw_pivot = gw_pivot.sort_values(by="id", ascending=True, na_position="last")
+
+    all_cols = gw_pivot.columns.tolist()
+    final_cols_start = ["id", "player_name", "team", "now_cost", "element_type"]
+    other_cols = [col for col in all_cols if col not in final_cols_start]
+    final_cols = final_cols_start + other_cols
+    gw_pivot = gw_pivot[final_cols]
+    gw_pivot = gw_pivot.fillna(0)
+    gw_pivot = gw_pivot.drop("player_id", axis=1)
+    gw_pivot = gw_pivot.rename(columns={"player_name": "name"})
+    return gw_pivot[gw_pivot["id"] != 0]
+
+
+def project(gameweeks, player_info=None, fixtures=None, teams=None):
+    """EV sheet for the given gameweeks from Dunks & Threes EPM projections.
+
+    player_info (needs code, id, name, now_cost, team, element_type), teams
+    (id, short_name) and fixtures default to fresh API data; pass what the
+    caller already has to skip fetching it again. Returns the EV frame, one
+    "Gameweek X - Day Y" column per gameday.
+    """
+    with warnings.catch_warnings(), pd.option_context("mode.chained_assignment", None):
+        warnings.simplefilter("ignore", urllib3.exceptions.InsecureRequestWarning)
+        if player_info is None or teams is None:
+            player_names, api_teams = get_player_info()
+            player_info = player_names if player_info is None else player_info
+            teams = api_teams if teams is None else teams
+        player_names = player_info.loc[player_info["code"] > 1]
+        player_names = player_names.sort_values(
+            ["now_cost", "team"], ascending=[False, True]
+        )
 
-team_strength = player_data.pivot_table(
-    values=["adj_off", "adj_def", "adj_pace"], index=["team_alias"], aggfunc="sum"
-)
-team_strength["rating"] = team_strength["adj_off"] + team_strength["adj_def"]
-team_strength = team_strength.reset_index()
-
-# %% game level projections
-# game_stats = matchup_stats('OKC', 'SAC', team_strength, df_adj.copy())
-gw_summary = []
-results_summary = [["Home", "home pts", "away pts", "Away"]]
-for f in gw_fixtures.values:
-    game_stats, result = matchup_stats(f[6], f[9], team_strength, player_data.copy())
-    game_stats["week"] = f[2]
-    game_stats["day"] = f[3]
-    game_stats["week_num"] = pd.to_numeric(f[2])
-    game_stats["day_num"] = pd.to_numeric(f[3])
-    gw_summary.append(game_stats)
-    gw_summary.append(game_stats)
-    results_summary.append(result)
-    del f, game_stats, result
-
-results_summary = pd.DataFrame(results_summary[1:], columns=results_summary[0])
-results_summary["spread"] = results_summary["home pts"] - results_summary["away pts"]
-results_summary["total"] = results_summary["home pts"] + results_summary["away pts"]
-
-gw_summary = pd.concat(gw_summary)
-
-gw_summary["gw_day_label"] = (
-    "Gameweek "
-    + gw_summary["week"].astype(str)
-    + " - Day "
-    + gw_summary["day"].astype(str)
-)
-label_sort_df = gw_summary[["gw_day_label", "week_num", "day_num"]].drop_duplicates()
-label_sort_df = label_sort_df.sort_values(by=["week_num", "day_num"])
-sorted_labels = label_sort_df["gw_day_label"].tolist()
-
-gw_pivot = pd.pivot_table(
-    gw_summary,
-    index=["player_id", "player_name"],
-    columns=["gw_day_label"],
-    values=["EV"],
-)
-gw_pivot.columns = gw_pivot.columns.droplevel(0)
-
-if gw_pivot.columns.nlevels == 1:
-    ev_cols = [label for label in sorted_labels if label in gw_pivot.columns]
-    other_cols = [col for col in gw_pivot.columns if col not in ev_cols]
-    gw_pivot = gw_pivot[other_cols + ev_cols]
-
-gw_pivot["EV total"] = gw_pivot.sum(axis=1, skipna=True)
-gw_pivot = gw_pivot.reset_index()
-gw_pivot = gw_pivot.merge(
-    player_names[["code", "id", "now_cost", "team", "element_type"]],
-    left_on=["player_id"],
-    right_on=["code"],
-    how="left",
-)
-gw_pivot = gw_pivot.drop("code", axis=1)
-gw_pivot["efficiency"] = gw_pivot["EV total"] / gw_pivot["now_cost"]
-
-gw_pivot["id"] = pd.to_numeric(gw_pivot["id"], errors="coerce").fillna(0).astype(int)
-gw_pivot = gw_pivot.sort_values(by="id", ascending=True, na_position="last")
-
-all_cols = gw_pivot.columns.tolist()
-final_cols_start = ["id", "player_name", "team", "now_cost", "element_type"]
-other_cols = [col for col in all_cols if col not in final_cols_start]
-final_cols = final_cols_start + other_cols
-gw_pivot = gw_pivot[final_cols]
-gw_pivot = gw_pivot.fillna(0)
-gw_pivot = gw_pivot.drop("player_id", axis=1)
-gw_pivot = gw_pivot.rename(columns={"player_name": "name"})
-gw_pivot = gw_pivot[gw_pivot["id"] != 0]
-gw_pivot.to_csv(f"{output_dir}/mou.csv", index=False, encoding="utf-8-sig")
+        if fixtures is None:
+            fixtures = get_fixture_info(
+                player_names.groupby("team").first().reset_index()
+            )
+        games = home_games(fixtures, player_names, gameweeks, teams)
+        if games.empty:
+            print(f"No fixtures found for the specified gameweeks: {gameweeks}.")
+            return None
+        print(f"Found {len(games)} fixtures for Gameweeks: {list(gameweeks)}")
+
+        player_data = epm_players(player_names)
+        team_strength = team_strengths(player_data)
+        gw_summary, _ = matchup_stats(games, team_strength, player_data)
+        return ev_sheet(gw_summary, player_names)
+
+
+if __name__ == "__main__":
+    gw_pivot = project(gws_to_run)
+    if gw_pivot is not None:
+        with open(output_dir / "settings.json") as f:
+            export_csv = json.load(f).get("export_ev_csv", False)
+        save_ev(gw_pivot, "mou", export_csv, output_dir)
@@ -0,0 +1,113 @@
+import re
+import unicodedata
+from io import StringIO
+from pathlib import Path
+
+import pandas as pd
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+ALIAS_FILE = DATA_DIR / "name_aliases.csv"
+CROSSWALK_FILE = DATA_DIR / "player_crosswalk.csv"
+
+SUFFIXES = {"jr", "sr", "ii", "iii", "iv", "v"}
+# letters NFKD can't split into base letter + accent
+EXTRA_LETTERS = str.maketrans(
+    {"đ": "d", "Đ": "D", "ł": "l", "Ł": "L", "ø": "o", "Ø": "O", "ß": "ss"}
+)
+
+
+def repair_mojibake(name):
+    # UTF-8 bytes read as Latin-1/cp1252 (sometimes twice) come back as "Ã©" etc.
+    for _ in range(2):
+        try:
+            fixed = name.encode("cp1252").decode("utf-8")
+        except UnicodeError:
+            try:
+                fixed = name.encode("latin-1").decode("utf-8")
+            except UnicodeError:
+                break
+        if fixed == name:
+            break
+        name = fixed
+    return name
+
+
+def fold_accents(name):
+    """Readable ASCII form of a name: "Nikola JokiÄ‡" -> "Nikola Jokic"."""
+    name = repair_mojibake(name).translate(EXTRA_LETTERS)
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return name.encode("ascii", "ignore").decode("ascii")
+
+
+def name_key(name):
+    """Key two spellings of the same player share: "P.J. Washington Jr." -> "pj washington"."""
+    key = fold_accents(name).lower()
+    key = re.sub(r"[.'`’]", "", key)
+    key = re.sub(r"[^a-z0-9]+", " ", key).split()
+    while len(key) > 2 and key[-1] in SUFFIXES:
+        key.pop()
+    return " ".join(key)
+
+
+def load_aliases(path=ALIAS_FILE):
+    if not path.exists():
+        return {}
+    aliases = pd.read_csv(path, encoding="utf-8-sig")
+    return {name_key(a): name_key(n) for a, n in zip(aliases["alias"], aliases["name"])}
+
+
+def build_name_index(ids, names):
+    """Map name keys (and their aliases) to ids; keys shared by two ids map to None."""
+    index = {}
+    for i, name in zip(ids, names):
+        if pd.isna(name):
+            continue
+        key = name_key(name)
+        index[key] = i if index.get(key, i) == i else None
+    # alias rows work in both directions, whichever spelling the ids came with
+    for alias, canonical in load_aliases().items():
+        if canonical in index and alias not in index:
+            index[alias] = index[canonical]
+        elif alias in index and canonical not in index:
+            index[canonical] = index[alias]
+    return index
+
+
+def resolve_names(names, index, source):
+    """Return the id of each name as an Int64 series, reporting the misses."""
+    keys = names.map(lambda x: name_key(x) if isinstance(x, str) else "")
+    ids = keys.map(index).astype("Int64")
+    unmatched = sorted(set(names[ids.isna()].dropna()))
+    if unmatched:
+        print(
+            f"{len(unmatched)} {source} name(s) could not be matched to a player "
+            f"(add them to {ALIAS_FILE.name}): {', '.join(unmatched)}"
+        )
+    return ids
+
+
+def update_crosswalk(players, column, ids, names, path=CROSSWALK_FILE):
+    """Record which source name belongs to which fantasy player id.
+
+    players needs id, code and name columns; column is the source being
+    recorded (e.g. "hashtag_name") and ids/names its resolved pairs.
+    """
+    crosswalk = players[["id", "code", "name"]].drop_duplicates("id")
+    old_text, columns = None, []
+    if path.exists():
+        old_text = path.read_text(encoding="utf-8-sig")
+        previous = pd.read_csv(StringIO(old_text))
+        columns = list(previous.columns)
+        previous = previous.drop(columns=["code", "name", column], errors="ignore")
+        crosswalk = crosswalk.merge(previous, on="id", how="left")
+    matched = pd.DataFrame({"id": ids, column: names}).dropna()
+    matched = matched.drop_duplicates("id")
+    crosswalk = crosswalk.merge(matched, on="id", how="left")
+    # keep the file's column order and only write it when a mapping changed
+    columns = [c for c in columns if c in crosswalk] + [
+        c for c in crosswalk if c not in columns
+    ]
+    text = crosswalk[columns].sort_values("id").to_csv(index=False)
+    if text != old_text:
+        path.write_text(text, encoding="utf-8-sig")
@@ -0,0 +1,235 @@
+"""Record API traffic to a compressed archive and serve it back locally.
+
+Recording: set FANTASY_NBA_RECORD to an archive path (e.g.
+../data/recordings/run.jsonl.gz) before running run_solve.py or mou_ev.py and
+every response the fetch layer returns is captured.
+
+Replaying: start the stand-in server with
+
+    python replay.py serve ../data/recordings/run.jsonl.gz --port 8765
+
+and run the pipeline with FANTASY_NBA_REPLAY_URL=http://127.0.0.1:8765 so all
+requests (Fantasy NBA API, Dunks & Threes, Yahoo injuries) go to it. The
+server can add latency and inject 429s, and `python replay.py bench` measures
+the fetch layer's throughput and retry behaviour against it.
+"""
+
+import argparse
+import atexit
+import base64
+import gzip
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+KEPT_HEADERS = ["Content-Type", "ETag", "Last-Modified"]
+
+_recorded = {}
+_record_lock = threading.Lock()
+
+
+def local_path(url):
+    """Map an absolute url onto the stand-in server's /host/path layout."""
+    parts = urlsplit(url)
+    path = f"/{parts.netloc}{parts.path}"
+    if parts.query:
+        path += f"?{parts.query}"
+    return path
+
+
+def record(url, status, headers, body):
+    with _record_lock:
+        _recorded[url] = {
+            "url": url,
+            "status": status,
+            "headers": {k: headers[k] for k in KEPT_HEADERS if k in headers},
+            "body": base64.b64encode(body).decode("ascii"),
+        }
+
+
+def save_recording(path):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with _record_lock:
+        records = list(_recorded.values())
+    if not records:
+        return
+    existing = {r["url"]: r for r in load_archive(path)} if Path(path).exists() else {}
+    existing.update({r["url"]: r for r in records})
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        for r in existing.values():
+            f.write(json.dumps(r) + "\n")
+    print(f"Recorded {len(records)} response(s) to {path}")
+
+
+def start_recording(path):
+    atexit.register(save_recording, path)
+
+
+def load_archive(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def make_handler(responses, latency=0.0, jitter=0.0, throttle=0.0, retry_after=1):
+    stats = {"requests": 0, "throttled": 0, "not_modified": 0, "missing": 0}
+    stats_lock = threading.Lock()
+
+    class StandInHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def count(self, key):
+            with stats_lock:
+                stats[key] += 1
+
+        def do_GET(self):
+            self.count("requests")
+            if latency or jitter:
+                time.sleep(latency + random.uniform(0, jitter))
+
+            if throttle and random.random() < throttle:
+                self.count("throttled")
+                self.send_response(429)
+                self.send_header("Retry-After", str(retry_after))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            entry = responses.get(self.path)
+            if entry is None:
+                self.count("missing")
+                body = b'{"detail": "Not found."}'
+                self.send_response(404)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+
+            status, headers, body, etag = entry
+            if etag is not None and self.headers.get("If-None-Match") == etag:
+                self.count("not_modified")
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            if etag is not None:
+                self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return StandInHandler, stats
+
+
+def build_responses(records):
+    responses = {}
+    for r in records:
+        body = base64.b64decode(r["body"])
+        headers = {k: v for k, v in r["headers"].items() if k != "ETag"}
+        etag = None
+        if r["status"] == 200:
+            etag = r["headers"].get("ETag") or (
+                '"' + hashlib.sha1(body).hexdigest() + '"'
+            )
+        responses[local_path(r["url"])] = (r["status"], headers, body, etag)
+    return responses
+
+
+def serve(
+    archive,
+    host="127.0.0.1",
+    port=8765,
+    latency=0.0,
+    jitter=0.0,
+    throttle=0.0,
+    retry_after=1,
+):
+    """Start the stand-in server in a background thread and return it."""
+    handler, stats = make_handler(
+        build_responses(load_archive(archive)), latency, jitter, throttle, retry_after
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.stats = stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench(archive, args):
+    import fetch
+
+    server = serve(
+        archive,
+        port=0,
+        latency=args.latency,
+        jitter=args.jitter,
+        throttle=args.throttle,
+        retry_after=args.retry_after,
+    )
+    fetch.REPLAY_URL = f"http://127.0.0.1:{server.server_port}"
+    urls = [
+        r["url"]
+        for r in load_archive(archive)
+        if "json" in r["headers"].get("Content-Type", "")
+    ]
+    start = time.perf_counter()
+    fetch.fetch_json_many(
+        urls, max_workers=args.workers, rate=args.rate, use_cache=False
+    )
+    elapsed = time.perf_counter() - start
+    stats = server.stats
+    print(
+        f"{len(urls)} urls in {elapsed:.2f}s ({len(urls) / elapsed:.1f}/s), "
+        f"{stats['requests']} requests, {stats['throttled']} throttled"
+    )
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["serve", "bench"])
+    parser.add_argument("archive")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="seconds")
+    parser.add_argument(
+        "--throttle", type=float, default=0.0, help="probability of a 429"
+    )
+    parser.add_argument("--retry-after", type=int, default=1, help="seconds")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=10.0, help="requests/s")
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        bench(args.archive, args)
+        return
+
+    server = serve(
+        args.archive,
+        args.host,
+        args.port,
+        args.latency,
+        args.jitter,
+        args.throttle,
+        args.retry_after,
+    )
+    print(f"Serving {args.archive} on http://{args.host}:{server.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,22 @@
-import requests
 import pandas as pd
 import numpy as np
 import json
 import re
-import time
 import datetime
 from tabulate import tabulate  # type: ignore
 
 from solver import nba_solver
+from ev import STAT_COLS, STAT_WEIGHTS, cached_ev_matrix
+from ev_store import load_ev, save_ev
+from fetch import API_BASE, fetch_json_many, get_json
+from fixtures import FIXTURE_FILE, game_rows, read_fixtures, refresh_fixtures, to_wide
+from names import build_name_index, resolve_names, update_crosswalk
+from simulate import simulate, team_total
 from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).parent.parent
 DATA_DIR = PROJECT_ROOT / "data"
+TEAM_STATE_DIR = DATA_DIR / "team_state"
 
 
 def load_settings():
@@ -88,24 +93,40 @@ settings = load_settings()
 )
 
 
-def print_transfer_chip_summary(result):
-    print(f"\nSolution {result['iter']} (Score: {result['score']:.2f})")
+def squad_moves(result):
+    """Sells and buys of every day of a solution, from squad matrix diffs.
 
+    Each day is compared with the squad of the last day before it that isn't
+    an All-Star day (the current squad for the first), as the All-Star squad
+    is dropped again the day after. Returns the days in order and, per day,
+    the row positions in full_player_df of the players sold and bought.
+    """
     full_player_df = result["full_player_df"]
-    wildcard = result["use_wc"]
-    allstar = result["use_as"]
+    days = sorted(tuple(day) for day in result["week_day_list"])
+    squad = full_player_df[[f"squad_{a}_{b}" for a, b in days]].to_numpy() == 1
+    allstar = np.array([f"{a}_{b}" in result["use_as"] for a, b in days], dtype=bool)
+
+    kept = np.column_stack(
+        [full_player_df["current"].to_numpy() == 1, squad[:, ~allstar]]
+    )
+    before = kept[:, np.cumsum(np.concatenate([[0], ~allstar[:-1]]))]
+    sells, buys = before & ~squad, ~before & squad
+    return days, [
+        (np.flatnonzero(sells[:, t]), np.flatnonzero(buys[:, t]))
+        for t in range(len(days))
+    ]
 
-    squad_day_cols = [col for col in full_player_df.columns if col.startswith("squad_")]
-    squad_day_cols.sort(key=lambda x: (int(x.split("_")[1]), int(x.split("_")[2])))
 
-    squad_day_cols.insert(0, "current")
+def print_transfer_chip_summary(result):
+    print(f"\nSolution {result['iter']} (Score: {result['score']:.2f})")
 
-    true_prev_col = "current"
+    names = result["full_player_df"]["name"].to_numpy()
+    wildcard = result["use_wc"]
+    allstar = result["use_as"]
 
-    for i in range(1, len(squad_day_cols)):
-        curr_col = squad_day_cols[i]
-        day_str = curr_col.replace("squad_", "")
-        week, day = day_str.split("_")
+    days, moves = squad_moves(result)
+    for (week, day), (sells, buys) in zip(days, moves):
+        day_str = f"{week}_{day}"
         line_text = f"Gameweek {week} - Day {day}: "
 
         # Check for chips
@@ -119,20 +140,12 @@ def print_transfer_chip_summary(result):
         if chip_text:
             line_text += f"({chip_text}) "
 
-        temp_sells = []
-        temp_buys = []
-
         # anly calculate transfers if its not an allstar day
-        if not is_as_day:
-            for _, row in full_player_df.iterrows():
-                if row[true_prev_col] != row[curr_col]:
-                    if row[true_prev_col] == 1:
-                        temp_sells.append(row["name"])
-                    else:
-                        temp_buys.append(row["name"])
+        if is_as_day:
+            sells, buys = [], []
 
-        sell_text = ", ".join(temp_sells)
-        buy_text = ", ".join(temp_buys)
+        sell_text = ", ".join(names[sells])
+        buy_text = ", ".join(names[buys])
 
         if sell_text or buy_text:
             line_text += f"{sell_text} -> {buy_text}"
@@ -141,9 +154,6 @@ def print_transfer_chip_summary(result):
 
         print(f"\t{line_text}")
 
-        if not is_as_day:
-            true_prev_col = curr_col
-
 
 def print_squad_lineups(result, initial_in_bank, initial_transfers_left, hit_cost):
     print(f"\n\n======= Squad Lineups for Iteration {result['iter']} =======")
@@ -153,27 +163,19 @@ def print_squad_lineups(result, initial_in_bank, initial_transfers_left, hit_cos
     wildcard = result["use_wc"]
     allstar = result["use_as"]
 
-    current_itb = initial_in_bank
-    current_loop_week = -1
-    week_ft_remaining = 0
-
-    squad_day_cols = [col for col in full_player_df.columns if col.startswith("squad_")]
-    squad_day_cols.sort(key=lambda x: (int(x.split("_")[1]), int(x.split("_")[2])))
-
-    squad_day_cols.insert(0, "current")
+    ids = full_player_df["id"].to_numpy()
+    names = full_player_df["name"].to_numpy()
+    costs = full_player_df["now_cost"].to_numpy() / 10
 
-    true_prev_col = "current"
     total_calculated_xpts = 0.0
 
     current_itb = initial_in_bank / 10
     current_loop_week = -1
     week_ft_remaining = 0
 
-    for i in range(1, len(squad_day_cols)):
-        curr_col = squad_day_cols[i]
-        current_day_str = curr_col.replace("squad_", "")
-        a, b = current_day_str.split("_")
-        a_int = int(a)
+    days, moves = squad_moves(result)
+    for (a_int, b), (sells, buys) in zip(days, moves):
+        current_day_str = f"{a_int}_{b}"
 
         is_as_day = current_day_str in allstar
         is_wc_day = current_day_str in wildcard
@@ -184,21 +186,10 @@ def print_squad_lineups(result, initial_in_bank, initial_transfers_left, hit_cos
         elif is_as_day:
             chip_played_str = " (All-Star)"
 
-        temp_sells = []
-        temp_buys = []
-        cost_of_sells = 0
-        cost_of_buys = 0
+        cost_of_sells = costs[sells].sum()
+        cost_of_buys = costs[buys].sum()
 
-        for _, row in full_player_df.iterrows():
-            if row[true_prev_col] != row[curr_col]:
-                if row[true_prev_col] == 1:
-                    temp_sells.append(f"Sell {row['id']} - {row['name']}")
-                    cost_of_sells += row["now_cost"] / 10
-                else:
-                    temp_buys.append(f"Buy {row['id']} - {row['name']}")
-                    cost_of_buys += row["now_cost"] / 10
-
-        nt_this_day = len(temp_buys)
+        nt_this_day = len(buys)
 
         is_new_week = a_int != current_loop_week
 
@@ -218,7 +209,7 @@ def print_squad_lineups(result, initial_in_bank, initial_transfers_left, hit_cos
         if pt_this_day > 0:
             hit_msg = f" (Hit: -{pt_this_day})"
 
-        print(f"Gameweek {a} - Day {b}{chip_played_str}{hit_msg} : ")
+        print(f"Gameweek {a_int} - Day {b}{chip_played_str}{hit_msg} : ")
 
         itb_before_this_day = current_itb
 
@@ -240,56 +231,39 @@ def print_squad_lineups(result, initial_in_bank, initial_transfers_left, hit_cos
                 f"\tITB={itb_before_this_day:.1f}->{itb_after_this_day:.1f}, FT={ft_this_day_str}, PT={pt_this_day}, NT={nt_this_day}"
             )
 
-        if temp_sells:
-            for s in temp_sells:
-                print(f"\t{s}")
-        if temp_buys:
-            for buy_str in temp_buys:
-                print(f"\t{buy_str}")
+        for k in sells:
+            print(f"\tSell {ids[k]} - {names[k]}")
+        for k in buys:
+            print(f"\tBuy {ids[k]} - {names[k]}")
 
         current_itb = itb_after_this_day
-        if not is_as_day:
-            true_prev_col = curr_col
 
         print("Line-up: ")
-        front_court = []
-        back_court = []
-        bench_list = []
-        day_xPts = 0.0
-
-        for _, row in combined_df.iterrows():
-            day_str = f"{a}_{b}"
-            team_col = f"team_{day_str}"
-            squad_col = f"squad_{day_str}"
-            cap_col = f"cap_{day_str}"
-            xpts_col = f"xPts_{day_str}"
-
-            if row[squad_col] == 1:
-                player_xpts = row.get(xpts_col, 0.0)
-                player_name = f"{row['name']}({player_xpts:.2f})"
-                if row[cap_col] == 1:
-                    player_name += " (C)"
-
-                if row[team_col] == 1:
-                    if row["element_type"] == 2:
-                        front_court.append(player_name)
-                    else:
-                        back_court.append(player_name)
-
-                    if row[cap_col] == 1 and not is_as_day:
-                        day_xPts += player_xpts * 2
-                    else:
-                        day_xPts += player_xpts
-                else:
-                    bench_list.append((player_xpts, player_name))
-
-        print("\t" + ", ".join(front_court))
-        print("\t" + ", ".join(back_court) + "\n")
-
-        bench_list.sort(key=lambda x: x[0], reverse=True)
-        bench_names = [name for xpts, name in bench_list]
-
-        print("Benched: \n " + "\t" + ", ".join(bench_names))
+        picks = combined_df[combined_df[f"squad_{current_day_str}"] == 1]
+        xpts_col = f"xPts_{current_day_str}"
+        if xpts_col in picks:
+            player_xpts = picks[xpts_col].to_numpy()
+        else:
+            player_xpts = np.zeros(len(picks))
+        captain = picks[f"cap_{current_day_str}"].to_numpy() == 1
+        playing = picks[f"team_{current_day_str}"].to_numpy() == 1
+        front = picks["element_type"].to_numpy() == 2
+        player_names = [
+            f"{name}({xpts:.2f})" + (" (C)" if cap else "")
+            for name, xpts, cap in zip(picks["name"], player_xpts, captain)
+        ]
+        player_names = np.array(player_names, dtype=object)
+
+        print("\t" + ", ".join(player_names[playing & front]))
+        print("\t" + ", ".join(player_names[playing & ~front]) + "\n")
+
+        bench = np.flatnonzero(~playing)
+        bench = bench[np.argsort(-player_xpts[bench], kind="stable")]
+
+        print("Benched: \n " + "\t" + ", ".join(player_names[bench]))
+
+        doubled = captain & playing if not is_as_day else np.zeros_like(captain)
+        day_xPts = (player_xpts[playing].sum() + player_xpts[doubled].sum()).item()
 
         final_day_score = day_xPts - pt_this_day
         print(f"Total xPts: {final_day_score:.2f}\n")
@@ -328,16 +302,15 @@ def main(
     weekly_hit_limit,
     ev_sheet,
 ):
-    fixture_file_path = DATA_DIR / "fixtures.csv"
+    player_info = teams = fixture_info = None
     if info_source == "API":
         print("Retrieving player and fixture data from Fantasy NBA API")
-        player_info = get_player_info()
+        player_info, teams = get_player_info()
         player_info.to_csv("../data/player_info.csv", index=False)
 
-        if not fixture_file_path.exists():
-            fixture_info = get_fixture_info(player_info)
-            fixture_info = clean_fixture_info(fixture_info)
-            fixture_info.to_csv("../data/fixtures.csv", index=False)
+        fixture_info = refresh_fixtures(
+            player_info, settings.get("fixture_refresh", "incremental")
+        )
 
     in_team, in_team_sell_price, cap_used, transfers_left, in_bank, current_api_gw = (
         read_team_json()
@@ -349,50 +322,22 @@ def main(
 
     if not ev_sheet:
         print("Generating EV")
-        player_info = pd.read_csv("../data/player_info.csv")
-        player_info = player_info[
-            (player_info["status"].isin(["a", "d"])) | (player_info["id"].isin(in_team))
+        all_players = pd.read_csv("../data/player_info.csv")
+        player_info = all_players[
+            (all_players["status"].isin(["a", "d"])) | (all_players["id"].isin(in_team))
         ]
         hashtag_data = read_hashtag()
-        name_fixes = {
-            "Walter Clayton": "Walter Clayton Jr.",
-            "Gary Trent": "Gary Trent Jr.",
-            "A.J. Johnson": "AJ Johnson",
-            "O.G. Anunoby": "OG Anunoby",
-            "Yanic Konan Niederhauser": "Yanic Konan Niederhäuser",
-            "Robert Williams": "Robert Williams III",
-            "PJ Washington": "P.J. Washington",
-            "R.J. Barrett": "RJ Barrett",
-            "Kevin McCullar Jr": "Kevin McCullar Jr.",
-            "Trey Murphy": "Trey Murphy III",
-            "Craig Porter Jr.": "Craig Porter",
-            "Derrick Jones": "Derrick Jones Jr.",
-            "KJ Simpson": "K.J. Simpson",
-            "Patrick Baldwin": "Patrick Baldwin Jr.",
-            "J.D. Davison": "JD Davison",
-            "Chris Manon": "Chris Mañon",
-            "Egor Demin": "Egor Dëmin",
-            "Kelly Oubre": "Kelly Oubre Jr.",
-            "AJ Green": "A.J. Green",
-            "Wendell Moore Jr": "Wendell Moore Jr.",
-            "Hugo Gonzalez": "Hugo González",
-            "David Duke": "David Duke Jr.",
-            "G.G. Jackson": "GG Jackson",
-            "C.J. McCollum": "CJ McCollum",
-            "Jeenathan Williams Jr.": "Jeenathan Williams",
-            "Cam Johnson": "Cameron Johnson",
-            "Ron Holland": "Ronald Holland II",
-            "Nicolas Claxton": "Nic Claxton",
-            "Herb Jones": "Herbert Jones",
-            "Bub Carrington": "Carlton Carrington",
-            "David Jones-Garcia": "David Jones",
-            "Mouhamadou Gueye": "Mouhamed Gueye",
-            "EJ Harkless": "Elijah Harkless",
-        }
-        hashtag_data["PLAYER"] = hashtag_data["PLAYER"].replace(name_fixes)
-        player_data = player_info.merge(
-            hashtag_data, left_on="name", right_on="PLAYER", how="inner"
+        name_index = build_name_index(all_players["id"], all_players["name"])
+        hashtag_data["id"] = resolve_names(
+            hashtag_data["PLAYER"], name_index, "hashtag"
         )
+        hashtag_data = hashtag_data.dropna(subset=["id"]).astype({"id": int})
+        hashtag_data = hashtag_data.drop_duplicates("id")
+        if "code" in all_players.columns:
+            update_crosswalk(
+                all_players, "hashtag_name", hashtag_data["id"], hashtag_data["PLAYER"]
+            )
+        player_data = player_info.merge(hashtag_data, on="id", how="inner")
         player_data = player_data[
             [
                 "id",
@@ -414,12 +359,14 @@ def main(
                 player_data["id"] == p_id, selling_price, player_data["now_cost"]
             )
         fixtures = read_fixtures(first_gd, first_gw, final_gw, final_gd)
-        player_data = player_data.merge(fixtures, on="id", how="inner")
+        player_data = player_data[player_data["id"].isin(fixtures["ids"])]
         team_def_strength = read_team_def_strength()
         team_def_strength.to_csv("../data/team_def_strength.csv", index=False)
         def_rating_dict = team_def_strength.set_index("TEAM").T.to_dict("list")
         location_dict = {"home": home, "away": away}
-        player_data = replace_with_value(player_data, location_dict, def_rating_dict)
+        player_data = replace_with_value(
+            player_data, fixtures, location_dict, def_rating_dict
+        )
         print(f"Players before value cutoff: {len(player_data)}")
         player_data["value"] = player_data["PPG"] / player_data["now_cost"]
         player_data = player_data[
@@ -435,26 +382,42 @@ def main(
             player_data[gd] = np.where(
                 player_data["id"].isin(ids_to_zero), 0, player_data[gd]
             )
-        player_data.to_csv("../data/NBA_EV.csv", index=False)
-        print("EV generated and output to NBA_EV.csv")
-    elif ev_sheet == "mou":
-        try:
-            player_data = pd.read_csv(
-                "../data/mou.csv", encoding="utf-8-sig", engine="python"
+        save_ev(player_data, "NBA_EV", settings.get("export_ev_csv", False))
+        print("EV generated and saved to the NBA_EV sheet")
+        if settings.get("ev_samples", 0) > 0:
+            dist, lineups = ev_distribution(
+                player_data[["id", "team", "element_type"] + STAT_COLS],
+                fixtures,
+                location_dict,
+                def_rating_dict,
+                settings["ev_samples"],
+                settings.get("ev_workers", 1),
+                in_team,
             )
-        except Exception:
-            player_data = pd.read_csv(
-                "../data/mou.csv", encoding="ISO-8859-1", engine="python"
+            save_ev(dist, "NBA_EV_dist", settings.get("export_ev_csv", False))
+            save_ev(lineups, "NBA_EV_lineup_dist", settings.get("export_ev_csv", False))
+            print(f"EV distributions from {settings['ev_samples']} samples saved")
+    elif ev_sheet in ("mou", "mou_live"):
+        if ev_sheet == "mou_live":
+            from mou_ev import project
+
+            print("Generating mou EV")
+            if player_info is None:
+                player_info = pd.read_csv("../data/player_info.csv")
+            if fixture_info is None:
+                fixture_info = pd.read_csv(FIXTURE_FILE)
+            player_data = project(
+                range(first_gw, final_gw + 1),
+                player_info=player_info,
+                fixtures=fixture_info,
+                teams=teams,
             )
-
-        player_data["id"] = (
-            pd.to_numeric(player_data["id"], errors="coerce").fillna(0).astype(int)
-        )
-        player_data["element_type"] = (
-            pd.to_numeric(player_data["element_type"], errors="coerce")
-            .fillna(0)
-            .astype(int)
-        )
+            if player_data is None:
+                return
+            save_ev(player_data, "mou", settings.get("export_ev_csv", False))
+        else:
+            print("Loading existing mou EV sheet")
+            player_data = load_ev("mou")
 
         player_data = player_data[player_data["element_type"].isin([1, 2])]
 
@@ -476,7 +439,7 @@ def main(
         player_data = player_data.drop(columns=["ev_across", "value"])
     else:
         print("Loading existing EV sheet")
-        player_data = pd.read_csv("../data/NBA_EV.csv")
+        player_data = load_ev("NBA_EV")
 
     if in_team_sell_price:
         print("\nApplying selling prices...")
@@ -517,6 +480,12 @@ def main(
         iteration_criteria=iteration_criteria,
         iteration_difference=iteration_difference,
         num_iterations=num_iterations,
+        prune=settings.get("prune_dominated", True),
+        model_builder=settings.get("model_builder", "sasoptpy"),
+        rolling_window=settings.get("rolling_window", 0),
+        rolling_overlap=settings.get("rolling_overlap", 0),
+        fine_days=settings.get("fine_days", 0),
+        chip_limits=chip_limits,
     )
 
     run_id = f"{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_{np.random.randint(10000, 99999)}"
@@ -575,13 +544,12 @@ def main(
 
 
 def get_player_info():
-    url = "https://nbafantasy.nba.com/api/bootstrap-static/"
-    r = requests.get(url)
-    json = r.json()
+    json = get_json(f"{API_BASE}bootstrap-static/")
     elements = pd.DataFrame(json["elements"])
     elements = elements[
         [
             "id",
+            "code",
             "first_name",
             "second_name",
             "now_cost",
@@ -591,40 +559,11 @@ def get_player_info():
         ]
     ]
     elements["name"] = elements["first_name"] + " " + elements["second_name"]
-    elements = elements[["id", "name", "now_cost", "team", "element_type", "status"]]
-    return elements
-
-
-def get_fixture_info(player_info):
-    fixtures = []
-    for i in player_info["id"]:
-        url = "https://nbafantasy.nba.com/api/element-summary/" + str(i) + "/"
-        r = requests.get(url)
-        while r.status_code == 429:
-            print("Too many requests, sleeping for 30s")
-            time.sleep(30)
-            r = requests.get(url)
-
-        json = r.json()
-        if json == {"detail": "Not found."}:
-            continue
-        else:
-            data = pd.DataFrame(json["fixtures"])
-            data["id"] = i
-            data = data[["team_h", "team_a", "event_name", "is_home", "id"]]
-            fixtures.append(data)
-    fixtures = pd.concat(fixtures)
-    return fixtures
-
-
-def clean_fixture_info(fixture_info):
-    fixture_info["opp_team"] = np.where(
-        fixture_info["is_home"], fixture_info["team_a"], fixture_info["team_h"]
-    )
-    fixture_info["location"] = np.where(fixture_info["is_home"], "home", "away")
-    fixture_info = fixture_info[["id", "event_name", "location", "opp_team"]]
-    fixture_info = fixture_info.dropna()
-    return fixture_info
+    elements = elements[
+        ["id", "code", "name", "now_cost", "team", "element_type", "status"]
+    ]
+    teams = pd.DataFrame(json["teams"])[["id", "name", "short_name"]]
+    return elements, teams
 
 
 def read_hashtag():
@@ -633,41 +572,11 @@ def read_hashtag():
     data = data[data["PLAYER"] != "PLAYER"]
     cols = ["PTS", "TREB", "AST", "STL", "BLK", "TO"]
     data[cols] = data[cols].apply(pd.to_numeric, errors="coerce")
-    multiplier = [1, 1.2, 1.5, 3, 3, -1]
-    data[cols] = data[cols] * multiplier
+    data[cols] = data[cols] * STAT_WEIGHTS
     data["PPG"] = data[cols].sum(axis=1)
     return data
 
 
-def read_fixtures(first_gd, first_gw, final_gw, final_gd):
-    fixtures = pd.read_csv("../Data/fixtures.csv")
-    fixtures["gameweek"] = (
-        fixtures["event_name"].str.findall("(\d+)").str[0].astype(int)
-    )
-    fixtures["gameday"] = fixtures["event_name"].str.findall("(\d+)").str[1].astype(int)
-    fixtures = fixtures[fixtures["gameweek"] <= final_gw]
-    fixtures = fixtures[fixtures["gameweek"] >= first_gw]
-    fixtures = fixtures[
-        (fixtures["gameweek"] > first_gw) | (fixtures["gameday"] >= first_gd)
-    ]
-    fixtures = fixtures[
-        (fixtures["gameweek"] < final_gw) | (fixtures["gameday"] <= final_gd)
-    ]
-    fixtures = fixtures[["id", "event_name", "location", "opp_team"]]
-    team_ids = pd.read_csv("../data/team_ids.csv")
-    fixtures = fixtures.merge(team_ids, left_on="opp_team", right_on="team_id")
-    fixtures["info"] = fixtures.apply(lambda x: [x["location"], x["team"]], axis=1)
-    fixtures = fixtures[["id", "event_name", "info"]]
-    cols = sorted(
-        fixtures["event_name"].unique(),
-        key=lambda x: (int(x.split()[1]), int(x.split()[-1])),
-    )
-    fixtures = fixtures.pivot(index="id", columns="event_name", values="info")
-    fixtures = fixtures[cols]
-    fixtures = fixtures.fillna("").reset_index()
-    return fixtures
-
-
 def read_team_def_strength():
     data = pd.read_csv("../Data/team_def_data_2425.csv")
     data_cols = ["PTS", "REB", "AST", "STL", "BLK", "TOV"]
@@ -688,43 +597,89 @@ def read_team_def_strength():
     return data
 
 
-def replace_with_value(player_data, location_dict, def_rating_dict):
-    game_cols = player_data.columns[12:].to_list()
-    for col in game_cols:
-        player_data[col] = player_data[col].apply(
-            lambda x: replace_values(x, location_dict)
-        )
-        player_data[col] = player_data[col].apply(
-            lambda x: replace_values(x, def_rating_dict)
-        )
-        player_data[col] = player_data.apply(transform_gameday, axis=1, col=col)
-        player_data[col] = player_data[col].apply(multiply_list)
-    return player_data
-
-
-def replace_values(lst, mapping):
-    return [mapping.get(item, item) for item in lst]
-
+def replace_with_value(player_data, fixtures, location_dict, def_rating_dict):
+    team_index = {team: k for k, team in enumerate(def_rating_dict)}
+    ratings = np.array(list(def_rating_dict.values()), dtype=float)
+    team_ids = pd.read_csv("../data/team_ids.csv", encoding="utf-8-sig")
+    # fixtures name opponents by team id, the ratings by team name
+    opp_lookup = np.full(team_ids["team_id"].max() + 1, -1)
+    opp_lookup[team_ids["team_id"]] = [team_index.get(t, -1) for t in team_ids["team"]]
+
+    player_data = player_data.reset_index(drop=True)
+    rows = game_rows(fixtures, player_data["id"])
+    n_rows = len(player_data)
+    # -1 where there is no game, like a missing rating
+    opponent = to_wide(fixtures, rows, opp_lookup[fixtures["opp_team"]] + 1, n_rows) - 1
+    ev = cached_ev_matrix(
+        player_data["id"].to_numpy(),
+        fixtures["days"],
+        player_data[STAT_COLS].to_numpy(dtype=float),
+        opponent,
+        to_wide(fixtures, rows, fixtures["is_home"], n_rows),
+        ratings,
+        location_dict["home"],
+        location_dict["away"],
+    )
+    return pd.concat([player_data, pd.DataFrame(ev, columns=fixtures["days"])], axis=1)
 
-def transform_gameday(row, col):
-    if not row[col]:
-        return [0, 0]
-    location = row[col][0]
-    action_list = row[col][1]
-    multiplied_values = [
-        action_list[0] * row["PTS"],
-        action_list[1] * row["TREB"],
-        action_list[2] * row["AST"],
-        action_list[3] * row["STL"],
-        action_list[4] * row["BLK"],
-        action_list[5] * row["TO"],
-    ]
-    total = sum(multiplied_values)
-    return [location, total]
 
+def ev_distribution(
+    player_data, fixtures, location_dict, def_rating_dict, samples, workers=1, squad=()
+):
+    """Simulated spread of every player game's points, one row per game.
+
+    Also returns the spread of each gameday's lineup total for the squad: its
+    five best players by mean (at most three per position) with a game that
+    day, sampled together so teammates and opponents share their game's pace.
+    """
+    team_index = {team: k for k, team in enumerate(def_rating_dict)}
+    ratings = np.array(list(def_rating_dict.values()), dtype=float)
+    team_ids = pd.read_csv("../data/team_ids.csv", encoding="utf-8-sig")
+    opp_lookup = np.full(team_ids["team_id"].max() + 1, -1)
+    opp_lookup[team_ids["team_id"]] = [team_index.get(t, -1) for t in team_ids["team"]]
+
+    player_data = player_data.reset_index(drop=True)
+    rows = game_rows(fixtures, player_data["id"])
+    opponent = opp_lookup[fixtures["opp_team"]]
+    keep = (rows >= 0) & (opponent >= 0)
+    rows, opponent = rows[keep], opponent[keep]
+    day, opp_team = fixtures["day_index"][keep], fixtures["opp_team"][keep]
+    venue = np.where(
+        fixtures["is_home"][keep], location_dict["home"], location_dict["away"]
+    )
 
-def multiply_list(lst):
-    return np.prod(lst)
+    # hashtag stats are already weighted, the simulation wants counts
+    counts = player_data[STAT_COLS].to_numpy(dtype=float) / STAT_WEIGHTS
+    lines = counts[rows] * ratings[opponent] * venue[:, None]
+    team = player_data["team"].to_numpy()[rows]
+    game = pd.MultiIndex.from_arrays(
+        [day, np.minimum(team, opp_team), np.maximum(team, opp_team)]
+    ).factorize()[0]
+
+    dist = simulate(lines, STAT_WEIGHTS, game, samples=samples, workers=workers)
+    dist.insert(0, "event_name", np.asarray(fixtures["days"])[day])
+    dist.insert(0, "id", player_data["id"].to_numpy()[rows])
+
+    ids = player_data["id"].to_numpy()[rows]
+    position = player_data["element_type"].to_numpy()[rows]
+    mean = dist["mean"].to_numpy()
+    in_squad = np.isin(ids, list(squad))
+    lineups = []
+    for d in np.unique(day[in_squad]):
+        options = np.flatnonzero(in_squad & (day == d))
+        lineup = []
+        for k in options[np.argsort(-mean[options], kind="stable")]:
+            if len(lineup) < 5 and (position[lineup] == position[k]).sum() < 3:
+                lineup.append(k)
+        total = team_total(lines[lineup], STAT_WEIGHTS, game[lineup], samples)
+        lineups.append(
+            {
+                "event_name": fixtures["days"][d],
+                "ids": ", ".join(str(i) for i in ids[lineup]),
+                **total,
+            }
+        )
+    return dist, pd.DataFrame(lineups)
 
 
 def apply_decay(player_data, decay_factor):
@@ -805,6 +760,78 @@ def calculate_fts(transfers, next_gd, as_gds, wc_gds, transfer_periods):
     return max(0, available_fts)
 
 
+def transfers_fingerprint(transfers):
+    # changes whenever a transfer is made, so a saved team state can be checked
+    # against the entry's transfer list without refetching everything else
+    return [len(transfers), max((t["time"] for t in transfers), default="")]
+
+
+def fetch_team_state(static, next_gd, picks_gw, transfers):
+    entry_url = f"{API_BASE}entry/{team_id}/"
+    urls = [
+        f"{entry_url}history/",
+        f"{entry_url}event/{picks_gw}/picks/",
+    ]
+    # the previous gameday's picks are only needed if this one has none, but
+    # asking for them up front keeps every request in a single concurrent round
+    if picks_gw > 1:
+        urls.append(f"{entry_url}event/{picks_gw - 1}/picks/")
+    history_data, picks_res, *fallback = fetch_json_many(urls)
+
+    if "detail" in picks_res and fallback:
+        picks_res = fallback[0]
+
+    chips_list = history_data.get("chips", [])
+    as_gds = [x["event"] for x in chips_list if x["name"] == "rich"]
+    wc_gds = [x["event"] for x in chips_list if x["name"] == "wildcard"]
+
+    fts = calculate_fts(transfers, next_gd, as_gds, wc_gds, gw_period)
+
+    player_db = {x["id"]: x for x in static["elements"]}
+
+    # latest purchase of each player, later entries win ties like a stable sort
+    last_bought = {}
+    for t in transfers:
+        pid = t["element_in"]
+        if pid not in last_bought or t["time"] >= last_bought[pid]["time"]:
+            last_bought[pid] = t
+
+    picks = []
+    for p in picks_res["picks"]:
+        pid = p["element"]
+        p_data = player_db.get(pid)
+
+        if p_data is not None:
+            now_cost = p_data["now_cost"]
+            start_cost = p_data["now_cost"] - p_data["cost_change_start"]
+            etype = p_data["element_type"]
+        else:
+            now_cost, start_cost, etype = 0, 0, 2
+        if pid in last_bought:
+            pur_price = last_bought[pid]["element_in_cost"]
+        else:
+            pur_price = start_cost
+
+        if now_cost > pur_price:
+            profit = now_cost - pur_price
+            sell_price = pur_price + (profit // 2)
+        else:
+            sell_price = now_cost
+
+        if sell_price > now_cost:
+            sell_price = now_cost
+
+        picks.append(
+            {"element": pid, "selling_price": sell_price, "element_type": etype}
+        )
+
+    return {
+        "picks": picks,
+        "bank": picks_res["entry_history"]["bank"],
+        "fts": fts,
+    }
+
+
 def read_team_json():
     current_gw = first_gw
 
@@ -822,98 +849,57 @@ def read_team_json():
                 current_gw = d["current_event"]
 
     elif team_data == "id":
-        BASE_URL = "https://nbafantasy.nba.com/api/"
-        with requests.Session() as session:
-            static_url = f"{BASE_URL}/bootstrap-static/"
-            static = session.get(static_url).json()
-
-            next_event = next((x for x in static["events"] if x["is_next"]), None)
-            curr_event = next((x for x in static["events"] if x["is_current"]), None)
-
-            if next_event:
-                next_gd = next_event["id"]
-                current_gw = next_event["id"]
-                picks_gw = next_event["id"] - 1
-            elif curr_event:
-                next_gd = curr_event["id"] + 1
-                current_gw = curr_event["id"]
-                picks_gw = curr_event["id"]
+        static = get_json(f"{API_BASE}bootstrap-static/")
+
+        next_event = next((x for x in static["events"] if x["is_next"]), None)
+        curr_event = next((x for x in static["events"] if x["is_current"]), None)
+
+        if next_event:
+            next_gd = next_event["id"]
+            current_gw = next_event["id"]
+            picks_gw = next_event["id"] - 1
+        elif curr_event:
+            next_gd = curr_event["id"] + 1
+            current_gw = curr_event["id"]
+            picks_gw = curr_event["id"]
+        else:
+            next_gd = 1
+            current_gw = 1
+            picks_gw = 1
+
+        if picks_gw < 1:
+            picks_gw = 1
+
+        # the derived state is reused by every solve until the next gameday
+        # starts, unless the live transfer list shows transfers made since
+        transfers = get_json(f"{API_BASE}entry/{team_id}/transfers/", use_cache=False)
+        fingerprint = transfers_fingerprint(transfers)
+        state_path = TEAM_STATE_DIR / f"{team_id}_{next_gd}.json"
+        state = None
+        if state_path.exists():
+            with open(state_path) as f:
+                state = json.load(f)
+            if state.get("fingerprint") == fingerprint:
+                print(f"Using saved team state for gameday {next_gd}")
             else:
-                next_gd = 1
-                current_gw = 1
-                picks_gw = 1
-
-            if picks_gw < 1:
-                picks_gw = 1
-
-            player_db = {
-                x["id"]: {
-                    "now_cost": x["now_cost"],
-                    "start_cost": x["now_cost"] - x["cost_change_start"],
-                    "name": f"{x['first_name']} {x['second_name']}",
-                    "element_type": x["element_type"],
-                }
-                for x in static["elements"]
-            }
-
-            history_url = f"{BASE_URL}/entry/{team_id}/history/"
-            history_data = session.get(history_url).json()
-            chips_list = history_data.get("chips", [])
-
-            as_gds = [x["event"] for x in chips_list if x["name"] == "rich"]
-            wc_gds = [x["event"] for x in chips_list if x["name"] == "wildcard"]
-
-            transfers_url = f"{BASE_URL}/entry/{team_id}/transfers/"
-            transfers = session.get(transfers_url).json()
-
-            fts = calculate_fts(transfers, next_gd, as_gds, wc_gds, gw_period)
-
-            purchase_map = {pid: v["start_cost"] for pid, v in player_db.items()}
-
-            for t in sorted(transfers, key=lambda x: x["time"]):
-                purchase_map[t["element_in"]] = t["element_in_cost"]
-
-            picks_url = f"{BASE_URL}/entry/{team_id}/event/{picks_gw}/picks/"
-            picks_res = session.get(picks_url).json()
-
-            if "detail" in picks_res:
-                picks_url = f"{BASE_URL}/entry/{team_id}/event/{picks_gw - 1}/picks/"
-                picks_res = session.get(picks_url).json()
-
-            current_picks = picks_res["picks"]
-            in_bank = picks_res["entry_history"]["bank"]
-
-            my_data = {"picks": []}
-
-            for p in current_picks:
-                pid = p["element"]
-                p_data = player_db.get(pid, {})
-
-                now_cost = p_data.get("now_cost", 0)
-                pur_price = purchase_map.get(pid, p_data.get("start_cost", 0))
-                etype = p_data.get("element_type", 2)
-
-                if now_cost > pur_price:
-                    profit = now_cost - pur_price
-                    sell_price = pur_price + (profit // 2)
-                else:
-                    sell_price = now_cost
-
-                if sell_price > now_cost:
-                    sell_price = now_cost
-
-                my_data["picks"].append(
-                    {"element": pid, "selling_price": sell_price, "element_type": etype}
-                )
-
-        in_team = [pick["element"] for pick in my_data["picks"]]
+                print("Transfers made since the team state was saved, refetching it")
+                state = None
+        if state is None:
+            state = fetch_team_state(static, next_gd, picks_gw, transfers)
+            state["fingerprint"] = fingerprint
+            TEAM_STATE_DIR.mkdir(parents=True, exist_ok=True)
+            with open(state_path, "w") as f:
+                json.dump(state, f)
+
+        in_team = [pick["element"] for pick in state["picks"]]
         in_team_sell_price = [
-            [pick["element"], pick["selling_price"]] for pick in my_data["picks"]
+            [pick["element"], pick["selling_price"]] for pick in state["picks"]
         ]
 
         cap_used = gw_cap_used
 
-        transfers_left = fts
+        transfers_left = state["fts"]
+        in_bank = state["bank"]
 
     return (in_team, in_team_sell_price, cap_used, transfers_left, in_bank, current_gw)
 
@@ -0,0 +1,130 @@
+"""Monte Carlo fantasy point distributions for player games.
+
+Every player game is an expected stat line (counts per stat). Each sample
+draws a pace shock per game, shared by everyone in it, and a minutes shock
+per player game. Stats are not sampled one by one: given those shocks each
+stat is treated as a Poisson count, and the weighted sum of the counts is
+drawn from a normal approximation with their summed mean and variance, one
+draw per sample instead of one per stat. Everything is batched as NumPy
+arrays.
+Rows are simulated in chunks, optionally spread over a process pool, with
+seeds fixed per chunk so the results don't depend on the number of workers.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+SAMPLES = 10000
+QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+PACE_CV = 0.05
+MINUTES_CV = 0.2
+CHUNK_ROWS = 64
+
+
+@lru_cache(maxsize=1024)
+def game_pace(seed, game, samples):
+    # lognormal with mean 1, seeded per game so every chunk and worker draws
+    # the same shocks for the same game
+    sigma = np.sqrt(np.log1p(PACE_CV**2))
+    rng = np.random.default_rng([seed, 0, game])
+    return rng.lognormal(-(sigma**2) / 2, sigma, size=samples).astype(np.float32)
+
+
+def pace_shocks(games, samples, seed):
+    return np.array([game_pace(seed, int(g), samples) for g in games]).reshape(
+        len(games), samples
+    )
+
+
+def sample_points(lines, weights, game, samples, seed, stream):
+    """(rows x samples) fantasy points for one block of rows.
+
+    Points are a normal approximation to the weighted sum of Poisson stat
+    counts, not a sum of sampled per-stat outcomes.
+    """
+    rng = np.random.default_rng([seed, 1, stream])
+    shape = 1 / MINUTES_CV**2
+    minutes = rng.standard_gamma(shape, size=(len(lines), samples), dtype=np.float32)
+    minutes /= shape
+    games, game = np.unique(game, return_inverse=True)
+    scale = minutes * pace_shocks(games, samples, seed)[game]
+    mean = (lines @ weights).astype(np.float32)[:, None] * scale
+    sd = np.sqrt((lines @ weights**2).astype(np.float32)[:, None] * scale)
+    return mean + sd * rng.standard_normal(size=scale.shape, dtype=np.float32)
+
+
+def summarise(points):
+    summary = {
+        "mean": points.mean(axis=-1, dtype=float),
+        "std": points.std(axis=-1, dtype=float),
+    }
+    # one sort serves every quantile (linear interpolation, like np.quantile)
+    points = np.sort(points, axis=-1)
+    n = points.shape[-1]
+    for q in QUANTILES:
+        pos = q * (n - 1)
+        lo = int(pos)
+        hi = min(lo + 1, n - 1)
+        summary[f"q{round(q * 100)}"] = points[..., lo] + (pos - lo) * (
+            points[..., hi] - points[..., lo]
+        ).astype(float)
+    return summary
+
+
+def _simulate_chunk(args):
+    lines, weights, game, samples, seed, stream = args
+    return summarise(sample_points(lines, weights, game, samples, seed, stream))
+
+
+def simulate(lines, weights, game, samples=SAMPLES, seed=0, workers=1):
+    """Mean, spread and quantiles of every row's fantasy points.
+
+    lines is (rows x stats) expected counts, weights the fantasy points per
+    stat and game an id of the game each row belongs to, so players in
+    the same game share its pace. workers > 1 shards the rows over a process
+    pool.
+    """
+    lines = np.asarray(lines, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    game = np.asarray(game)
+    jobs = [
+        (
+            lines[start : start + CHUNK_ROWS],
+            weights,
+            game[start : start + CHUNK_ROWS],
+            samples,
+            seed,
+            k + 1,
+        )
+        for k, start in enumerate(range(0, len(lines), CHUNK_ROWS))
+    ]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            chunks = list(pool.map(_simulate_chunk, jobs))
+    else:
+        chunks = [_simulate_chunk(job) for job in jobs]
+    if not chunks:
+        return pd.DataFrame(columns=list(summarise(np.zeros((0, 1)))))
+    return pd.DataFrame(
+        {key: np.concatenate([c[key] for c in chunks]) for key in chunks[0]}
+    )
+
+
+def team_total(lines, weights, game, samples=SAMPLES, seed=0):
+    """Distribution of the summed points of a set of rows (e.g. a lineup).
+
+    The rows are sampled jointly, so players sharing a game also share its
+    pace shock and the spread of the total reflects that covariance.
+    """
+    points = sample_points(
+        np.asarray(lines, dtype=float),
+        np.asarray(weights, dtype=float),
+        np.asarray(game),
+        samples,
+        seed,
+        0,
+    )
+    return {key: float(value) for key, value in summarise(points.sum(axis=0)).items()}
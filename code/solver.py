@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import sasoptpy as so  # type: ignore
 import highspy
@@ -6,119 +7,343 @@ from pathlib import Path
 import os
 import time
 
+from highs_model import KINDS, build_model, chip_columns, column, pass_model
 
 BINARY_THRESHOLD = 0.5
+TEAM_LIMIT = 2
+
+
+def prune_dominated(data, point_columns, protected, unavailable):
+    """Drop players no optimal plan needs, returning the rest and the drop count.
+
+    k dominates j when they share a team and position, k costs no more and
+    has at least j's EV on every day (ties broken by id). A player with
+    TEAM_LIMIT dominators can always be swapped out: on any day at most
+    TEAM_LIMIT - 1 teammates are held alongside them, so a dominator is
+    free to take their place without breaking team limits, budget or adding
+    transfers. Protected players (current squad, locked, booked in) are kept
+    and unavailable ones (banned today, booked out) can't dominate.
+    """
+    ids = data.index.to_numpy()
+    points = data[point_columns].to_numpy(dtype=float)
+    cost = data["now_cost"].to_numpy(dtype=float)
+    can_dominate = ~data.index.isin(list(unavailable))
+
+    dominated = pd.Series(False, index=data.index)
+    groups = data.groupby(["team", "element_type"], observed=True).indices
+    for rows in groups.values():
+        if len(rows) <= TEAM_LIMIT:
+            continue
+        ev, price, pid = points[rows], cost[rows], ids[rows]
+        # [k, j]: k is at least as good as j on every count
+        no_worse = (price[:, None] <= price[None, :]) & (
+            ev[:, None, :] >= ev[None, :, :]
+        ).all(axis=2)
+        same = no_worse & no_worse.T
+        beats = no_worse & (~same | (pid[:, None] < pid[None, :]))
+        beats &= can_dominate[rows][:, None]
+        dominated.iloc[rows] = beats.sum(axis=0) >= TEAM_LIMIT
+
+    dominated &= ~data.index.isin(list(protected))
+    return data[~dominated], int(dominated.sum())
+
+
+def coarsen_horizon(data, point_columns, fine_days, decay, keep):
+    """Merge the days after the first fine_days into one period per gameweek.
+
+    A period is named after its first day and its EV is its days' EV decayed
+    back to that day, so a squad and lineup held through it score what they
+    would day by day. "Captain <column>" columns hold each player's best
+    decayed day of the period, as a captain only doubles one day. Days in keep
+    (chips, booked transfers) stay periods of their own. Returns the data with
+    the merged columns, the period columns and the days of each period.
+    """
+    days = [
+        tuple(int(x) for x in re.findall(r"(\d+)", col)[:2]) for col in point_columns
+    ]
+    periods = []
+    for k, (w, d) in enumerate(days):
+        if (
+            k > fine_days
+            and periods[-1][0] >= fine_days
+            and days[periods[-1][0]][0] == w
+            and f"{w}_{d}" not in keep
+            and "{}_{}".format(*days[periods[-1][-1]]) not in keep
+        ):
+            periods[-1].append(k)
+        else:
+            periods.append([k])
+
+    points = data[point_columns].to_numpy(dtype=float)
+    merged, captain = {}, {}
+    for period in periods:
+        col = point_columns[period[0]]
+        decayed = points[:, period] * decay ** np.arange(len(period))
+        merged[col] = decayed.sum(axis=1)
+        captain[f"Captain {col}"] = decayed.max(axis=1)
+    data = pd.concat(
+        [
+            data.drop(columns=point_columns),
+            pd.DataFrame(merged, index=data.index),
+            pd.DataFrame(captain, index=data.index),
+        ],
+        axis=1,
+    )
+    return (
+        data,
+        list(merged),
+        {days[period[0]]: [days[k][1] for k in period] for period in periods},
+    )
 
 
-def nba_solver(
+def flips(on_cols, off_cols):
+    """Count of binaries that leave their current value, as (cols, coefs, constant).
+
+    on_cols are at 1 in the current solution and off_cols at 0.
+    """
+    return (
+        list(on_cols) + list(off_cols),
+        [-1] * len(on_cols) + [1] * len(off_cols),
+        len(on_cols),
+    )
+
+
+def previous_day(a, b, week_day_dict, current_week, current_day):
+    """The day before (a, b) whose squad it transfers from, or (-1, -1)."""
+    a_prev, b_prev = -1, -1
+    if a == current_week and b == current_day:
+        return a_prev, b_prev
+    if b > 1:
+        current_index = week_day_dict[a].index(b)
+        a_prev, b_prev = a, week_day_dict[a][current_index - 1]
+    elif a > current_week:
+        a_prev = a - 1
+        if a_prev in week_day_dict:
+            b_prev = max(week_day_dict[a_prev])
+        else:
+            a_prev = -1
+    return a_prev, b_prev
+
+
+def allstar_return(as_day_str, week_day_dict, current_week, current_day, final_gw):
+    """(day before, day after) an All-Star day, whose squads must match.
+
+    The day before is None when the All-Star day is the first day, in which
+    case the squad returns to the current one. None if there is nothing to tie.
+    """
+    try:
+        as_week_str, as_day_str_int = as_day_str.strip().split("_")
+        as_week = int(as_week_str)
+        as_day = int(as_day_str_int)
+    except ValueError:
+        print(f"Warning: Invalid AllStar day format '{as_day_str}'. Skipping.")
+        return None
+
+    a_before, b_before = -1, -1
+    a_after, b_after = -1, -1
+    try:
+        if as_day > 1 and as_week in week_day_dict:
+            as_day_index = week_day_dict[as_week].index(as_day)
+            if as_day_index > 0:
+                a_before, b_before = (
+                    as_week,
+                    week_day_dict[as_week][as_day_index - 1],
+                )
+        elif as_week > current_week:
+            a_before = as_week - 1
+            if a_before in week_day_dict:
+                b_before = max(week_day_dict[a_before])
+        elif as_week == current_week and as_day > current_day:
+            as_day_index = week_day_dict[as_week].index(as_day)
+            if as_day_index > 0:
+                a_before, b_before = (
+                    as_week,
+                    week_day_dict[as_week][as_day_index - 1],
+                )
+
+        if as_week in week_day_dict:
+            as_day_index = week_day_dict[as_week].index(as_day)
+            if as_day_index < len(week_day_dict[as_week]) - 1:
+                a_after, b_after = (
+                    as_week,
+                    week_day_dict[as_week][as_day_index + 1],
+                )
+            elif as_week < final_gw:
+                a_after = as_week + 1
+                if a_after in week_day_dict:
+                    b_after = min(week_day_dict[a_after])
+    except (ValueError, IndexError):
+        return None
+
+    if b_after not in week_day_dict.get(a_after, []):
+        return None
+    if a_before != -1:
+        if b_before not in week_day_dict.get(a_before, []):
+            return None
+        return (a_before, b_before), (a_after, b_after)
+    if as_week == current_week and as_day == current_day:
+        return None, (a_after, b_after)
+    return None
+
+
+def booked_squad_days(booked_transfers, week_day_dict, player_ids):
+    """(player, week, day, 1 or 0) for every booked transfer in or out."""
+    booked_squad = []
+    for bt in booked_transfers:
+        bt_week = bt.get("gw", None)
+        bt_day = bt.get("day", None)
+
+        if bt_week is None or bt_day is None:
+            continue
+
+        if bt_week not in week_day_dict or bt_day not in week_day_dict[bt_week]:
+            print(
+                f"Warning: Booked transfer for GW{bt_week} Day{bt_day} is outside solve range"
+            )
+            continue
+
+        player_in = bt.get("transfer_in", None)
+        player_out = bt.get("transfer_out", None)
+
+        if player_in is not None and player_in in player_ids:
+            booked_squad.append((player_in, bt_week, bt_day, 1))
+
+        if player_out is not None and player_out in player_ids:
+            booked_squad.append((player_out, bt_week, bt_day, 0))
+    return booked_squad
+
+
+def fill_lineups(grid, idle, pos1):
+    """Start idle squad members on days the solver started fewer than five.
+
+    With idle starters fixed at 0 a lineup may come back short; they score
+    nothing, so starting them changes no points but keeps every reported
+    lineup a valid five (two or three of each position). grid is the solved
+    (player x day x kind) binaries and is filled in place.
+    """
+    squad, team = KINDS.index("squad"), KINDS.index("team")
+    for t in np.flatnonzero(grid[:, :, team].sum(axis=0) < 5):
+        starters = grid[:, t, team]
+        while starters.sum() < 5:
+            n1, n2 = (starters & pos1).sum(), (starters & ~pos1).sum()
+            if n1 < 2:
+                allowed = pos1
+            elif n2 < 2:
+                allowed = ~pos1
+            else:
+                allowed = np.where(pos1, n1 < 3, n2 < 3)
+            bench = grid[:, t, squad] & ~starters & allowed
+            # idle players first, so the lineup's points stay as solved
+            order = np.concatenate(
+                [np.flatnonzero(bench & idle[:, t]), np.flatnonzero(bench)]
+            )
+            if not len(order):
+                break
+            starters[order[0]] = True
+    return grid
+
+
+def solved(solver_instance):
+    return solver_instance.getModelStatus() in (
+        highspy.HighsModelStatus.kOptimal,
+        highspy.HighsModelStatus.kTimeLimit,
+    )
+
+
+def lp_bound(solver_instance):
+    """Points bound of the loaded model's LP relaxation, or None."""
+    integrality = np.array(solver_instance.getLp().integrality_, dtype=np.int32)
+    cols = np.arange(len(integrality), dtype=np.int32)
+    continuous = np.full(len(cols), int(highspy.HighsVarType.kContinuous), np.int32)
+    solver_instance.changeColsIntegrality(len(cols), cols, continuous)
+    solver_instance.run()
+    optimal = solver_instance.getModelStatus() == highspy.HighsModelStatus.kOptimal
+    bound = -solver_instance.getInfo().objective_function_value if optimal else None
+    solver_instance.changeColsIntegrality(len(cols), cols, integrality)
+    return bound
+
+
+def rolling_solve(solver_instance, day_cols, window, overlap):
+    """Relax-and-fix solve of the loaded model over windows of days.
+
+    day_cols is (day x columns), the columns of each day. A window's days are integer and
+    every later day continuous; once solved, the window's days before its
+    overlap are fixed at their values and the next window starts at the
+    overlap. Returns the last window's solution and status, which cover the
+    whole horizon, and leaves the model's bounds and integrality as they were.
+    """
+    lp = solver_instance.getLp()
+    lower, upper = np.array(lp.col_lower_), np.array(lp.col_upper_)
+    integrality = np.array(lp.integrality_, dtype=np.int32)
+    continuous = int(highspy.HighsVarType.kContinuous)
+
+    start = 0
+    while True:
+        end = min(start + window, len(day_cols))
+        print(f"Rolling horizon: solving days {start + 1}-{end} of {len(day_cols)}")
+        kinds = integrality.copy()
+        kinds[day_cols[end:].ravel()] = continuous
+        cols = np.arange(len(kinds), dtype=np.int32)
+        solver_instance.changeColsIntegrality(len(cols), cols, kinds)
+        solver_instance.run()
+        if end == len(day_cols) or not solved(solver_instance):
+            break
+        fixed = day_cols[start : end - overlap].ravel()
+        values = np.round(np.array(solver_instance.getSolution().col_value)[fixed])
+        solver_instance.changeColsBounds(len(fixed), fixed, values, values)
+        start = end - overlap
+
+    solution = solver_instance.getSolution()
+    model_status = solver_instance.getModelStatus()
+    cols = np.arange(len(integrality), dtype=np.int32)
+    solver_instance.changeColsIntegrality(len(cols), cols, integrality)
+    solver_instance.changeColsBounds(len(cols), cols, lower, upper)
+    return solution, model_status
+
+
+def binary(model, name, fixed):
+    # sasoptpy writes a binary with ub=0 as both FX and BV bounds, which HiGHS
+    # warns about when reading the MPS file; a fixed continuous column is the
+    # same variable with a single bound
+    if fixed:
+        return model.add_variable(name=name, lb=0, ub=0)
+    return model.add_variable(name=name, vartype=so.binary)
+
+
+def sasoptpy_model(
+    problem_name,
     data,
+    player_ids,
+    point_columns,
+    cap_points,
+    idle,
+    no_transfer,
+    week_day_dict,
+    decay_dict,
+    penalty_dict,
+    as_returns,
+    previous,
+    booked_squad,
+    positions,
+    teams,
+    in_team,
+    in_team_flag_for_solver,
     locked,
-    banned,
     gd_banned,
     use_wc,
     use_as,
-    booked_transfers,
     day_solve,
-    in_team,
     cap_used,
+    money,
     transfers_left,
-    in_bank,
-    decay,
-    gap,
-    max_time,
-    transfer_penalty,
     hit_cost,
     weekly_hit_limit,
-    first_gw,
-    first_gd,
-    final_gw,
-    final_gd,
-    current_api_gw,
-    iteration=0,
-    previous_solutions=None,
-    iteration_criteria="",
-    iteration_difference=1,
-    num_iterations=1,
+    current_week,
+    current_day,
+    chip_limits=None,
+    chip_returns=None,
 ):
-    team_value = data[data["id"].isin(in_team)]["now_cost"].sum()
-    money = team_value + in_bank
-    print(f"Money: {money}")
-
-    pristine_player_ids = data["id"].tolist()
-    pristine_in_team_flag = {
-        id: 1 if id in in_team else 0 for id in pristine_player_ids
-    }
-    pristine_output_df = data[["id", "name", "now_cost", "element_type"]].copy()
-    pristine_output_df["current"] = pristine_output_df["id"].map(pristine_in_team_flag)
-
-    pristine_data_for_printing = data.copy()
-
-    data = data[~data["id"].isin(banned)]
-    data = data.set_index("id")
-
-    player_ids = data.index.tolist()
-    missing_players_in_solver = [pid for pid in in_team if pid not in player_ids]
-    if missing_players_in_solver:
-        print(
-            f"CRITICAL ERROR: The following players from 'in_team' are missing from the EV data (player_ids): {missing_players_in_solver}"
-        )
-        print(
-            "This is likely due to the 'value_cutoff' setting or an incomplete 'NBA_EV.csv' file."
-        )
-        print("The solver cannot continue as this will result in a 9-player team.")
-        raise ValueError(f"Missing players from in_team: {missing_players_in_solver}")
-
-    point_columns = [
-        col for col in data.columns if re.match(r"^Gameweek \d+ - Day \d+$", col)
-    ]
-    print(f"Found {len(point_columns)} point columns: {point_columns}")
-
-    filtered_point_columns = []
-    for col in point_columns:
-        week = int(re.findall(r"(\d+)", col)[0])
-        day = int(re.findall(r"(\d+)", col)[1])
-
-        in_range = True
-        if week < first_gw or (week == first_gw and day < first_gd):
-            in_range = False
-        if week > final_gw or (week == final_gw and day > final_gd):
-            in_range = False
-
-        if in_range:
-            filtered_point_columns.append(col)
-
-    point_columns = filtered_point_columns
-
-    # create dictionary of gameweeks + game days
-    week_day_list = []
-    week_day_dict = {}
-    for col in point_columns:
-        week = int(re.findall("(\d+)", col)[0])
-        day = int(re.findall("(\d+)", col)[1])
-        temp_list = [week, day]
-        week_day_list.append(temp_list)
-
-    for inner_list in week_day_list:
-        key = inner_list[0]
-        value = inner_list[1]
-
-        if key not in week_day_dict:
-            week_day_dict[key] = []
-        week_day_dict[key].append(value)
-
-    current_week = min(list(week_day_dict.keys()))
-    current_day = min(list(week_day_dict[current_week]))
-
-    in_team_flag_for_solver = {id: 1 if id in in_team else 0 for id in player_ids}
-
-    # create columns for team and position
-    positions = pd.get_dummies(data, columns=["element_type"], prefix="pos")[
-        ["pos_1", "pos_2"]
-    ].astype(int)
-    teams = pd.get_dummies(data, columns=["team"], prefix="team")
-    teams = teams.loc[:, teams.columns.str.startswith("team_")].astype(int)
-
-    problem_name = "nba_optimizer"
+    """The solver's model as a sasoptpy Model, solved through an MPS file."""
     model = so.Model(name=problem_name)
 
     # flattening
@@ -136,21 +361,33 @@ def nba_solver(
             name=f"pt_{w}", lb=0, vartype=so.integer
         )
 
-    for i in player_ids:
-        for w, d in all_week_days:
+    chip_day = [f"{w}_{d}" in use_as or f"{w}_{d}" in use_wc for w, d in all_week_days]
+    for p, i in enumerate(player_ids):
+        for t, (w, d) in enumerate(all_week_days):
             squad_var[i, w, d] = model.add_variable(
                 name=f"squad_{i}_{w}_{d}", vartype=so.binary
             )
-            team_var[i, w, d] = model.add_variable(
-                name=f"team_{i}_{w}_{d}", vartype=so.binary
-            )
-            cap_var[i, w, d] = model.add_variable(
-                name=f"cap_{i}_{w}_{d}", vartype=so.binary
+            team_var[i, w, d] = binary(model, f"team_{i}_{w}_{d}", idle[p, t])
+            cap_var[i, w, d] = binary(
+                model, f"cap_{i}_{w}_{d}", idle[p, t] or chip_day[t]
             )
-            transfer_var[i, w, d] = model.add_variable(
-                name=f"transfer_{i}_{w}_{d}", vartype=so.binary
+            transfer_var[i, w, d] = binary(
+                model, f"transfer_{i}_{w}_{d}", no_transfer[t]
             )
 
+    # chips the solver places itself, after the player-day variables like the
+    # highspy builder's columns
+    chip_limits = {k: v for k, v in (chip_limits or {}).items() if v > 0}
+    chip_returns = chip_returns or {}
+    chip_var = {}
+    for kind in chip_limits:
+        for t, (w, d) in enumerate(all_week_days):
+            chip_var[kind, w, d] = binary(model, f"{kind}_{w}_{d}", no_transfer[t])
+    # transfers are free on a chip day and on the day an All-Star squad returns
+    free = {(w, d): [chip_var[k, w, d] for k in chip_limits] for w, d in all_week_days}
+    for (w, d), (before, after) in chip_returns.items():
+        free[after].append(chip_var["as", w, d])
+
     # points dict
     points = {}
     position_map = {}
@@ -173,28 +410,28 @@ def nba_solver(
 
             position_map[(a, b)] = position
             for i in player_ids:
-                points[(i, a, b)] = data[point_columns[position - 1]][i]
-
-    # apply decay to transfer penalties
-    decay_factor = decay
-    cumulative_index = 0
-
-    decay_dict = {}
-    for week, days in sorted(week_day_dict.items()):
-        decay_dict[week] = {}
-        for day in days:
-            decay_dict[week][day] = decay_factor**cumulative_index
-            cumulative_index += 1
+                points[(i, a, b)] = float(data[point_columns[position - 1]][i])
+    cap_bonus = {
+        (i, a, b): float(cap_points[p, t])
+        for p, i in enumerate(player_ids)
+        for t, (a, b) in enumerate(all_week_days)
+    }
 
-    base_penalty = transfer_penalty
-    penalty_dict = {
-        week: {
-            day: base_penalty[str(day)]
-            for day in week_day_dict[week]
-            if str(day) in base_penalty
+    # bench / lineup share of an All-Star day, only worth having with EV
+    as_bench_var = {}
+    as_team_var = {}
+    if "as" in chip_limits:
+        has_as = {
+            (i, w, d): points[(i, w, d)] > 0 and not no_transfer[t]
+            for i in player_ids
+            for t, (w, d) in enumerate(all_week_days)
         }
-        for week in week_day_dict.keys()
-    }
+        for share, share_var in (("bench", as_bench_var), ("team", as_team_var)):
+            for i in player_ids:
+                for w, d in all_week_days:
+                    share_var[i, w, d] = binary(
+                        model, f"as_{share}_{i}_{w}_{d}", not has_as[i, w, d]
+                    )
 
     # Main stuff
     if day_solve:
@@ -218,7 +455,7 @@ def nba_solver(
                 if f"{a}_{b}" in use_as
                 else (
                     (points[(i, a, b)] * team_var[i, a, b])
-                    + (points[(i, a, b)] * cap_var[i, a, b])
+                    + (cap_bonus[(i, a, b)] * cap_var[i, a, b])
                 )
             )
             * decay_dict[a][b]
@@ -240,129 +477,139 @@ def nba_solver(
             for w in week_day_dict.keys()
         )
 
+        objective_expr += so.expr_sum(
+            points[(i, a, b)]
+            * 0.05
+            * (as_bench_var[i, a, b] - as_team_var[i, a, b])
+            * decay_dict[a][b]
+            for i, a, b in as_bench_var
+        )
+
     model.set_objective(-objective_expr, sense="N", name="total_points")
 
     # post allstar team reset
-    if not day_solve:
-        for as_day_str in use_as:
-            as_week, as_day = -1, -1
-            try:
-                as_week_str, as_day_str_int = as_day_str.strip().split("_")
-                as_week = int(as_week_str)
-                as_day = int(as_day_str_int)
-            except ValueError:
-                print(f"Warning: Invalid AllStar day format '{as_day_str}'. Skipping.")
-                continue
-
-            if as_week != -1 and as_day != -1:
-                a_before, b_before = -1, -1
-                a_after, b_after = -1, -1
+    for before, after in as_returns:
+        a_after, b_after = after
+        if before is not None:
+            a_before, b_before = before
+            model.add_constraints(
+                (
+                    squad_var[i, a_after, b_after] == squad_var[i, a_before, b_before]
+                    for i in player_ids
+                ),
+                name=f"as_return_{a_after}_{b_after}",
+            )
+        else:
+            model.add_constraints(
+                (
+                    squad_var[i, a_after, b_after] == in_team_flag_for_solver[i]
+                    for i in player_ids
+                ),
+                name=f"as_return_initial_{a_after}_{b_after}",
+            )
 
-                try:
-                    if as_day > 1 and as_week in week_day_dict:
-                        as_day_index = week_day_dict[as_week].index(as_day)
-                        if as_day_index > 0:
-                            a_before, b_before = (
-                                as_week,
-                                week_day_dict[as_week][as_day_index - 1],
-                            )
-                    elif as_week > current_week:
-                        a_before = as_week - 1
-                        if a_before in week_day_dict:
-                            b_before = max(week_day_dict[a_before])
-                    elif as_week == current_week and as_day > current_day:
-                        as_day_index = week_day_dict[as_week].index(as_day)
-                        if as_day_index > 0:
-                            a_before, b_before = (
-                                as_week,
-                                week_day_dict[as_week][as_day_index - 1],
-                            )
-
-                    if as_week in week_day_dict:
-                        as_day_index = week_day_dict[as_week].index(as_day)
-                        if as_day_index < len(week_day_dict[as_week]) - 1:
-                            a_after, b_after = (
-                                as_week,
-                                week_day_dict[as_week][as_day_index + 1],
-                            )
-                        elif as_week < final_gw:
-                            a_after = as_week + 1
-                            if a_after in week_day_dict:
-                                b_after = min(week_day_dict[a_after])
-
-                    if a_after != -1:
-                        if a_before != -1:
-                            print(
-                                f"Applying AllStar 'team return' constraint: Day {a_after}_{b_after} team = Day {a_before}_{b_before} team."
-                            )
-                            model.add_constraints(
-                                (
-                                    squad_var[i, a_after, b_after]
-                                    == squad_var[i, a_before, b_before]
-                                    for i in player_ids
-                                ),
-                                name=f"as_return_{as_week}_{as_day}",
-                            )
-                        elif as_week == current_week and as_day == current_day:
-                            model.add_constraints(
-                                (
-                                    squad_var[i, a_after, b_after]
-                                    == in_team_flag_for_solver[i]
-                                    for i in player_ids
-                                ),
-                                name=f"as_return_initial_{as_week}_{as_day}",
-                            )
-
-                except (ValueError, KeyError, IndexError):
-                    pass
+    # placed chips: how many, one a day, no captain, and for All-Star the
+    # bench / lineup shares and the squad returning the day after
+    for kind, limit in chip_limits.items():
+        model.add_constraint(
+            so.expr_sum(chip_var[kind, a, b] for a, b in all_week_days) <= limit,
+            name=f"chip_limit_{kind}",
+        )
+    for a, b in all_week_days:
+        if len(chip_limits) > 1:
+            model.add_constraint(
+                so.expr_sum(chip_var[k, a, b] for k in chip_limits) <= 1,
+                name=f"one_chip_{a}_{b}",
+            )
+        if chip_limits:
+            model.add_constraint(
+                so.expr_sum(cap_var[i, a, b] for i in player_ids)
+                + so.expr_sum(chip_var[k, a, b] for k in chip_limits)
+                <= 1,
+                name=f"chip_no_cap_{a}_{b}",
+            )
+    for i, a, b in as_bench_var:
+        if not has_as[i, a, b]:
+            continue
+        model.add_constraint(
+            as_bench_var[i, a, b] <= squad_var[i, a, b],
+            name=f"as_bench_squad_{i}_{a}_{b}",
+        )
+        model.add_constraint(
+            as_bench_var[i, a, b] <= chip_var["as", a, b],
+            name=f"as_bench_chip_{i}_{a}_{b}",
+        )
+        model.add_constraint(
+            as_team_var[i, a, b] >= team_var[i, a, b] + chip_var["as", a, b] - 1,
+            name=f"as_team_{i}_{a}_{b}",
+        )
+    for (a, b), (before, after) in chip_returns.items():
+        a_after, b_after = after
+        for i in player_ids:
+            if before is None:
+                kept = in_team_flag_for_solver[i]
+            else:
+                kept = squad_var[i, before[0], before[1]]
+            model.add_constraint(
+                squad_var[i, a_after, b_after] - kept <= 1 - chip_var["as", a, b],
+                name=f"as_chip_return_up_{i}_{a}_{b}",
+            )
+            model.add_constraint(
+                squad_var[i, a_after, b_after] - kept >= chip_var["as", a, b] - 1,
+                name=f"as_chip_return_down_{i}_{a}_{b}",
+            )
 
     # constraints
+    # with idle starters fixed at 0 a lineup may have fewer than five and the
+    # weekly captain may go unused, neither of which costs points while EV >= 0
+    relax = idle.any()
+    player_pos = {i: p for p, i in enumerate(player_ids)}
+    day_pos = {day: t for t, day in enumerate(all_week_days)}
 
     for a in week_day_dict.keys():
+        captains = so.expr_sum(
+            cap_var[i, a, b] for b in week_day_dict[a] for i in player_ids
+        )
         if cap_used and a == current_week:
-            model.add_constraint(
-                so.expr_sum(
-                    cap_var[i, a, b] for b in week_day_dict[a] for i in player_ids
-                )
-                == 0,
-                name=f"no_cap_week_{a}",
-            )
+            model.add_constraint(captains == 0, name=f"no_cap_week_{a}")
+        elif relax:
+            model.add_constraint(captains <= 1, name=f"cap_week_{a}")
         else:
-            model.add_constraint(
-                so.expr_sum(
-                    cap_var[i, a, b] for b in week_day_dict[a] for i in player_ids
-                )
-                == 1,
-                name=f"cap_week_{a}",
-            )
+            model.add_constraint(captains == 1, name=f"cap_week_{a}")
 
         for b in week_day_dict[a]:
             current_day_str = f"{a}_{b}"
             is_this_day_allstar = current_day_str in use_as
-            is_this_day_wildcard = current_day_str in use_wc
-
-            if is_this_day_allstar or is_this_day_wildcard:
-                model.add_constraint(
-                    so.expr_sum(cap_var[i, a, b] for i in player_ids) == 0,
-                    name=f"no_cap_as_{a}_{b}",
-                )
+            t = day_pos[a, b]
 
             model.add_constraint(
                 so.expr_sum(squad_var[i, a, b] for i in player_ids) == 10,
                 name=f"squad_size_{a}_{b}",
             )
-            model.add_constraint(
-                so.expr_sum(team_var[i, a, b] for i in player_ids) == 5,
-                name=f"team_size_{a}_{b}",
-            )
-
-            model.add_constraint(
-                so.expr_sum(
-                    positions["pos_1"][i] * team_var[i, a, b] for i in player_ids
+            if relax:
+                model.add_constraint(
+                    so.expr_sum(team_var[i, a, b] for i in player_ids) <= 5,
+                    name=f"team_size_{a}_{b}",
+                )
+                model.add_constraint(
+                    so.expr_sum(
+                        positions["pos_2"][i] * team_var[i, a, b] for i in player_ids
+                    )
+                    <= 3,
+                    name=f"team_pos2_max_{a}_{b}",
+                )
+            else:
+                model.add_constraint(
+                    so.expr_sum(team_var[i, a, b] for i in player_ids) == 5,
+                    name=f"team_size_{a}_{b}",
+                )
+                model.add_constraint(
+                    so.expr_sum(
+                        positions["pos_1"][i] * team_var[i, a, b] for i in player_ids
+                    )
+                    >= 2,
+                    name=f"team_pos1_min_{a}_{b}",
                 )
-                >= 2,
-                name=f"team_pos1_min_{a}_{b}",
-            )
             model.add_constraint(
                 so.expr_sum(
                     positions["pos_1"][i] * team_var[i, a, b] for i in player_ids
@@ -379,27 +626,42 @@ def nba_solver(
             )
 
             if not day_solve and not is_this_day_allstar:
+                # an All-Star day lifts the budget by more than any squad costs
+                lift = 0
+                if "as" in chip_limits:
+                    lift = chip_var["as", a, b] * float(
+                        data["now_cost"].nlargest(10).sum()
+                    )
                 model.add_constraint(
                     so.expr_sum(
                         data["now_cost"][i] * squad_var[i, a, b] for i in player_ids
                     )
-                    <= money,
+                    <= money + lift,
                     name=f"budget_{a}_{b}",
                 )
 
             for team in teams:
                 model.add_constraint(
                     so.expr_sum(teams[team][i] * squad_var[i, a, b] for i in player_ids)
-                    <= 2,
+                    <= TEAM_LIMIT,
                     name=f"team_limit_{team}_{a}_{b}",
                 )
 
+            # fixed team and captain columns need no link to the squad
             model.add_constraints(
-                (team_var[i, a, b] <= squad_var[i, a, b] for i in player_ids),
+                (
+                    team_var[i, a, b] <= squad_var[i, a, b]
+                    for i in player_ids
+                    if not idle[player_pos[i], t]
+                ),
                 name=f"team_squad_rel_{a}_{b}",
             )
             model.add_constraints(
-                (cap_var[i, a, b] <= team_var[i, a, b] for i in player_ids),
+                (
+                    cap_var[i, a, b] <= team_var[i, a, b]
+                    for i in player_ids
+                    if not idle[player_pos[i], t] and not chip_day[t]
+                ),
                 name=f"cap_team_rel_{a}_{b}",
             )
 
@@ -407,60 +669,39 @@ def nba_solver(
     if not day_solve:
         for a in week_day_dict.keys():
             for b in week_day_dict[a]:
-                current_day_str = f"{a}_{b}"
-                is_this_day_wildcard = current_day_str in use_wc
-                is_this_day_allstar = current_day_str in use_as
+                # transfers are fixed at 0 on chip days and after All-Star
+                if no_transfer[day_pos[a, b]]:
+                    continue
 
-                a_prev, b_prev = -1, -1
-                is_prev_day_allstar = False
+                a_prev, b_prev = previous[a, b]
                 is_first_day = a == current_week and b == current_day
-
-                if not is_first_day:
-                    if b > 1:
-                        current_index = week_day_dict[a].index(b)
-                        a_prev, b_prev = a, week_day_dict[a][current_index - 1]
-                    elif a > current_week:
-                        a_prev = a - 1
-                        if a_prev in week_day_dict:
-                            b_prev = max(week_day_dict[a_prev])
-                        else:
-                            a_prev = -1
-
-                    if a_prev != -1:
-                        prev_day_str = f"{a_prev}_{b_prev}"
-                        if prev_day_str in use_as:
-                            is_prev_day_allstar = True
+                free_today = so.expr_sum(v for v in free[a, b])
 
                 for i in player_ids:
-                    if is_this_day_wildcard or is_this_day_allstar:
+                    if is_first_day:
                         model.add_constraint(
-                            transfer_var[i, a, b] == 0,
-                            name=f"no_transfer_chip_{i}_{a}_{b}",
+                            transfer_var[i, a, b]
+                            >= squad_var[i, a, b]
+                            - in_team_flag_for_solver[i]
+                            - free_today,
+                            name=f"transfer_first_{i}_{a}_{b}",
                         )
-                    elif is_prev_day_allstar:
+                    elif a_prev != -1:
                         model.add_constraint(
-                            transfer_var[i, a, b] == 0,
-                            name=f"no_transfer_after_as_{i}_{a}_{b}",
+                            transfer_var[i, a, b]
+                            >= squad_var[i, a, b]
+                            - squad_var[i, a_prev, b_prev]
+                            - free_today,
+                            name=f"transfer_{i}_{a}_{b}",
                         )
                     else:
-                        if is_first_day:
-                            model.add_constraint(
-                                transfer_var[i, a, b]
-                                >= squad_var[i, a, b] - in_team_flag_for_solver[i],
-                                name=f"transfer_first_{i}_{a}_{b}",
-                            )
-                        elif a_prev != -1:
-                            model.add_constraint(
-                                transfer_var[i, a, b]
-                                >= squad_var[i, a, b] - squad_var[i, a_prev, b_prev],
-                                name=f"transfer_{i}_{a}_{b}",
-                            )
-                        else:
-                            model.add_constraint(
-                                transfer_var[i, a, b]
-                                >= squad_var[i, a, b] - in_team_flag_for_solver[i],
-                                name=f"transfer_default_{i}_{a}_{b}",
-                            )
+                        model.add_constraint(
+                            transfer_var[i, a, b]
+                            >= squad_var[i, a, b]
+                            - in_team_flag_for_solver[i]
+                            - free_today,
+                            name=f"transfer_default_{i}_{a}_{b}",
+                        )
 
             total_transfers_in_week = so.expr_sum(
                 transfer_var[i, a, b] for b in week_day_dict[a] for i in player_ids
@@ -514,6 +755,8 @@ def nba_solver(
                 for i in in_team
                 if i in player_ids
             )
+            + min_players_to_keep
+            * so.expr_sum(v for v in free[current_week, current_day])
             >= min_players_to_keep,
             name="min_players_from_current",
         )
@@ -528,60 +771,442 @@ def nba_solver(
         name="banned_today",
     )
 
-    if not day_solve and booked_transfers:
-        print("Adding booked transfer constraints")
-        for bt in booked_transfers:
-            bt_week = bt.get("gw", None)
-            bt_day = bt.get("day", None)
+    for i, a, b, value in booked_squad:
+        model.add_constraint(
+            squad_var[i, a, b] == value,
+            name=f"booked_{'in' if value else 'out'}_{a}_{b}_{i}",
+        )
 
-            if bt_week is None or bt_day is None:
-                continue
+    return model
+
+
+def nba_solver(
+    data,
+    locked,
+    banned,
+    gd_banned,
+    use_wc,
+    use_as,
+    booked_transfers,
+    day_solve,
+    in_team,
+    cap_used,
+    transfers_left,
+    in_bank,
+    decay,
+    gap,
+    max_time,
+    transfer_penalty,
+    hit_cost,
+    weekly_hit_limit,
+    first_gw,
+    first_gd,
+    final_gw,
+    final_gd,
+    current_api_gw,
+    iteration=0,
+    previous_solutions=None,
+    iteration_criteria="",
+    iteration_difference=1,
+    num_iterations=1,
+    prune=True,
+    model_builder="sasoptpy",
+    rolling_window=0,
+    rolling_overlap=0,
+    fine_days=0,
+    chip_limits=None,
+):
+    if rolling_window and not 0 <= rolling_overlap < rolling_window:
+        raise ValueError("rolling_overlap must be at least 0 and below rolling_window")
+
+    team_value = data[data["id"].isin(in_team)]["now_cost"].sum()
+    money = team_value + in_bank
+    print(f"Money: {money}")
+
+    pristine_player_ids = data["id"].tolist()
+    pristine_in_team_flag = {
+        id: 1 if id in in_team else 0 for id in pristine_player_ids
+    }
+    pristine_output_df = data[["id", "name", "now_cost", "element_type"]].copy()
+    pristine_output_df["current"] = pristine_output_df["id"].map(pristine_in_team_flag)
+
+    pristine_data_for_printing = data.copy()
+
+    data = data[~data["id"].isin(banned)]
+    data = data.set_index("id")
+
+    player_ids = data.index.tolist()
+    missing_players_in_solver = [pid for pid in in_team if pid not in player_ids]
+    if missing_players_in_solver:
+        print(
+            f"CRITICAL ERROR: The following players from 'in_team' are missing from the EV data (player_ids): {missing_players_in_solver}"
+        )
+        print(
+            "This is likely due to the 'value_cutoff' setting or an incomplete 'NBA_EV.csv' file."
+        )
+        print("The solver cannot continue as this will result in a 9-player team.")
+        raise ValueError(f"Missing players from in_team: {missing_players_in_solver}")
+
+    point_columns = [
+        col for col in data.columns if re.match(r"^Gameweek \d+ - Day \d+$", col)
+    ]
+    print(f"Found {len(point_columns)} point columns: {point_columns}")
+
+    filtered_point_columns = []
+    for col in point_columns:
+        week = int(re.findall(r"(\d+)", col)[0])
+        day = int(re.findall(r"(\d+)", col)[1])
+
+        in_range = True
+        if week < first_gw or (week == first_gw and day < first_gd):
+            in_range = False
+        if week > final_gw or (week == final_gw and day > final_gd):
+            in_range = False
+
+        if in_range:
+            filtered_point_columns.append(col)
+
+    point_columns = filtered_point_columns
+    horizon = sorted(
+        tuple(int(x) for x in re.findall(r"(\d+)", col)[:2]) for col in point_columns
+    )
+
+    captain_columns = []
+    periods = {}
+    if fine_days and len(point_columns) > fine_days:
+        keep = set(use_wc) | set(use_as)
+        keep |= {f"{bt.get('gw')}_{bt.get('day')}" for bt in booked_transfers}
+        data, point_columns, periods = coarsen_horizon(
+            data, point_columns, fine_days, 1 if day_solve else decay, keep
+        )
+        captain_columns = [f"Captain {col}" for col in point_columns]
+        merged = [days for days in periods.values() if len(days) > 1]
+        print(
+            f"Solving the first {fine_days} days daily and "
+            f"{sum(map(len, merged))} later days as {len(merged)} periods"
+        )
+
+    # create dictionary of gameweeks + game days
+    week_day_list = []
+    week_day_dict = {}
+    for col in point_columns:
+        week = int(re.findall("(\d+)", col)[0])
+        day = int(re.findall("(\d+)", col)[1])
+        temp_list = [week, day]
+        week_day_list.append(temp_list)
+
+    for inner_list in week_day_list:
+        key = inner_list[0]
+        value = inner_list[1]
+
+        if key not in week_day_dict:
+            week_day_dict[key] = []
+        week_day_dict[key].append(value)
+
+    if prune:
+        booked_in = {bt.get("transfer_in") for bt in booked_transfers}
+        booked_out = {bt.get("transfer_out") for bt in booked_transfers}
+        before = len(data)
+        data, pruned = prune_dominated(
+            data,
+            point_columns + captain_columns,
+            set(in_team) | set(locked) | booked_in,
+            set(gd_banned) | booked_out,
+        )
+        player_ids = data.index.tolist()
+        print(
+            f"Pruned {pruned} of {before} players dominated by {TEAM_LIMIT} teammates; "
+            f"{4 * pruned * len(week_day_list)} fewer variables"
+        )
+
+    current_week = min(list(week_day_dict.keys()))
+    current_day = min(list(week_day_dict[current_week]))
+
+    in_team_flag_for_solver = {id: 1 if id in in_team else 0 for id in player_ids}
+
+    # create columns for team and position
+    positions = pd.get_dummies(data, columns=["element_type"], prefix="pos")[
+        ["pos_1", "pos_2"]
+    ].astype(int)
+    teams = pd.get_dummies(data, columns=["team"], prefix="team")
+    teams = teams.loc[:, teams.columns.str.startswith("team_")].astype(int)
+    # categorical teams from the EV store keep columns for filtered-out teams
+    teams = teams.loc[:, teams.any()]
+
+    # flattening
+    all_week_days = [(w, d) for w in week_day_dict.keys() for d in week_day_dict[w]]
+
+    # apply decay to transfer penalties
+    # by position in the full horizon, so merged periods decay from their first day
+    decay_factor = decay
+    day_number = {day: k for k, day in enumerate(horizon)}
+
+    decay_dict = {}
+    for week, days in sorted(week_day_dict.items()):
+        decay_dict[week] = {}
+        for day in days:
+            decay_dict[week][day] = decay_factor ** day_number[week, day]
 
-            if bt_week not in week_day_dict or bt_day not in week_day_dict[bt_week]:
+    base_penalty = transfer_penalty
+    penalty_dict = {
+        week: {
+            day: base_penalty[str(day)]
+            for day in week_day_dict[week]
+            if str(day) in base_penalty
+        }
+        for week in week_day_dict.keys()
+    }
+
+    as_returns = []
+    if not day_solve:
+        for as_day_str in use_as:
+            as_return = allstar_return(
+                as_day_str, week_day_dict, current_week, current_day, final_gw
+            )
+            if as_return is None:
+                continue
+            before, after = as_return
+            if before is not None:
                 print(
-                    f"Warning: Booked transfer for GW{bt_week} Day{bt_day} is outside solve range"
+                    f"Applying AllStar 'team return' constraint: Day {after[0]}_{after[1]} team = Day {before[0]}_{before[1]} team."
                 )
-                continue
+            as_returns.append(as_return)
 
-            player_in = bt.get("transfer_in", None)
-            player_out = bt.get("transfer_out", None)
+    previous = {
+        (a, b): previous_day(a, b, week_day_dict, current_week, current_day)
+        for a, b in all_week_days
+    }
 
-            if player_in is not None and player_in in player_ids:
-                model.add_constraint(
-                    squad_var[player_in, bt_week, bt_day] == 1,
-                    name=f"booked_in_{bt_week}_{bt_day}_{player_in}",
-                )
+    chip_day = np.array(
+        [f"{a}_{b}" in use_as or f"{a}_{b}" in use_wc for a, b in all_week_days],
+        dtype=bool,
+    )
+    no_transfer = np.zeros(len(all_week_days), dtype=bool)
+    if not day_solve:
+        after_as = [f"{a}_{b}" in use_as for a, b in previous.values()]
+        no_transfer = chip_day | np.array(after_as, dtype=bool)
+
+    # a player with no EV on a day gains nothing from starting or captaincy;
+    # fixing those columns relies on EV never being negative
+    points_matrix = data[point_columns].to_numpy(dtype=float)
+    idle = (points_matrix == 0) & (points_matrix >= 0).all()
+    cap_points = data[captain_columns or point_columns].to_numpy(dtype=float)
+    no_cap = idle | chip_day
+    fixed_cols = idle.sum() + no_cap.sum() + no_transfer.sum() * len(player_ids)
+    print(
+        f"Fixed {fixed_cols} of {4 * idle.size} player-day columns at 0 "
+        f"({idle.sum()} idle starters)"
+    )
 
-            if player_out is not None and player_out in player_ids:
-                model.add_constraint(
-                    squad_var[player_out, bt_week, bt_day] == 0,
-                    name=f"booked_out_{bt_week}_{bt_day}_{player_out}",
-                )
+    booked_squad = []
+    if not day_solve and booked_transfers:
+        print("Adding booked transfer constraints")
+        booked_squad = booked_squad_days(booked_transfers, week_day_dict, player_ids)
+
+    # chips the solver places itself on days that don't already have one
+    chip_limits = {
+        kind: int((chip_limits or {}).get(kind) or 0) for kind in ("wc", "as")
+    }
+    chip_limits = {k: v for k, v in chip_limits.items() if v > 0 and not day_solve}
+    chip_returns = {}
+    if "as" in chip_limits:
+        for t, (a, b) in enumerate(all_week_days):
+            if no_transfer[t]:
+                continue
+            as_return = allstar_return(
+                f"{a}_{b}", week_day_dict, current_week, current_day, final_gw
+            )
+            if as_return is not None:
+                chip_returns[a, b] = as_return
+    if chip_limits:
+        print(
+            "Placing up to "
+            + ", ".join(f"{v} {k.upper()}" for k, v in chip_limits.items())
+        )
+
+    problem_name = "nba_optimizer"
+    build_start = time.time()
+    if model_builder == "highspy":
+        model = build_model(
+            points_matrix,
+            cap_points,
+            idle,
+            data["now_cost"].to_numpy(dtype=float),
+            positions["pos_1"].to_numpy(),
+            data["team"].to_numpy(),
+            player_ids,
+            week_day_dict,
+            decay_dict,
+            penalty_dict,
+            as_returns,
+            previous,
+            no_transfer,
+            booked_squad,
+            in_team,
+            locked,
+            gd_banned,
+            use_wc,
+            use_as,
+            day_solve,
+            cap_used,
+            money,
+            transfers_left,
+            hit_cost,
+            weekly_hit_limit,
+            current_week,
+            current_day,
+            TEAM_LIMIT,
+            chip_limits,
+            chip_returns,
+        )
+    else:
+        model = sasoptpy_model(
+            problem_name,
+            data,
+            player_ids,
+            point_columns,
+            cap_points,
+            idle,
+            no_transfer,
+            week_day_dict,
+            decay_dict,
+            penalty_dict,
+            as_returns,
+            previous,
+            booked_squad,
+            positions,
+            teams,
+            in_team,
+            in_team_flag_for_solver,
+            locked,
+            gd_banned,
+            use_wc,
+            use_as,
+            day_solve,
+            cap_used,
+            money,
+            transfers_left,
+            hit_cost,
+            weekly_hit_limit,
+            current_week,
+            current_day,
+            chip_limits,
+            chip_returns,
+        )
+    print(f"Built the model with {model_builder} in {time.time() - build_start:.2f}s")
 
     # iters
     solutions = []
+    player_pos = {i: p for p, i in enumerate(player_ids)}
+    day_pos = {day: t for t, day in enumerate(all_week_days)}
 
-    for iteration_num in range(num_iterations):
-        print(f"\n=== Solving Iteration {iteration_num} ===")
+    def col_index(kind, p, t):
+        return column(len(week_day_dict), len(all_week_days), kind, p, t)
 
+    def col(kind, i, a, b):
+        return col_index(kind, player_pos[i], day_pos[a, b])
+
+    # objective as a vector over the columns, to score a raw solution
+    if model_builder == "highspy":
+        objective, objective_constant = model["col_cost"], 0
+    else:
+        names = {v.get_name(): k for k, v in enumerate(model.get_variables())}
+        objective = np.zeros(len(names))
+        objective_constant = 0
+        for name, member in model.get_objective().get_member_dict().items():
+            if member["ref"] is None:
+                objective_constant = member["val"]
+            else:
+                objective[names[name]] = member["val"]
+
+    # where each printed player sits in the solution (-1: not in the model)
+    # and their EV per day, looked up once instead of per iteration
+    output_rows = pd.Index(player_ids).get_indexer(pristine_output_df["id"])
+    printing_points = pristine_data_for_printing.set_index("id").reindex(
+        pristine_output_df["id"]
+    )
+    output_points = {
+        (a, b): printing_points[
+            [f"Gameweek {a} - Day {d}" for d in periods.get((a, b), [b])]
+        ]
+        .sum(axis=1, min_count=1)
+        .to_numpy()
+        for a, b in all_week_days
+        if f"Gameweek {a} - Day {b}" in data.columns
+    }
+
+    # one live instance for every iteration; each adds its diversity row to it
+    solver_instance = highspy.Highs()
+    if model_builder == "highspy":
+        pass_model(solver_instance, model)
+    else:
         tmp_folder = Path() / "tmp"
         tmp_folder.mkdir(exist_ok=True, parents=True)
 
-        mps_file_name = f"tmp/{problem_name}_{iteration_num}.mps"
+        mps_file_name = f"tmp/{problem_name}.mps"
         model.export_mps(mps_file_name)
-        print(f"Exported problem: {problem_name}_{iteration_num}")
-
-        solver_instance = highspy.Highs()
+        print(f"Exported problem: {problem_name}")
         solver_instance.readModel(str(mps_file_name))
-        solver_instance.setOptionValue("parallel", "on")
-        solver_instance.setOptionValue("time_limit", max_time)
-        solver_instance.setOptionValue("mip_rel_gap", gap)
-        solver_instance.setOptionValue("log_to_console", True)
+        try:
+            time.sleep(0.1)
+            os.unlink(mps_file_name)
+        except:  # noqa: E722
+            pass
+    solver_instance.setOptionValue("parallel", "on")
+    solver_instance.setOptionValue("time_limit", max_time)
+    solver_instance.setOptionValue("mip_rel_gap", gap)
+    solver_instance.setOptionValue("log_to_console", True)
+
+    # columns a diversity row can force to change: the first day's, the next
+    # day's transfers, the first week's captaincy and the weekly hit counts.
+    # The rest of an incumbent is kept as the next iteration's start and HiGHS
+    # completes it where it can.
+    players = np.arange(len(player_ids))
+    first = day_pos[current_week, current_day]
+    first_week = [day_pos[current_week, b] for b in week_day_dict[current_week]]
+    repair = [np.arange(len(week_day_dict))]
+    for kind in KINDS:
+        repair.append(col_index(kind, players, first))
+    repair.append(col_index("transfer", players, min(first + 1, len(day_pos) - 1)))
+    repair.append(col_index("cap", players[:, None], first_week).ravel())
+    warm_start = None
+    chip_cols = chip_columns(
+        len(week_day_dict), len(player_ids), len(all_week_days), list(chip_limits)
+    )
+    chip_start = len(week_day_dict) + len(KINDS) * len(player_ids) * len(all_week_days)
+
+    if rolling_window:
+        # every column that belongs to one day: the player-day binaries, the
+        # day's chips and, with the All-Star chip, its bench / lineup shares
+        num_days = len(all_week_days)
+        share_start = chip_start + len(chip_cols) * num_days
+        shares = [] if "as" not in chip_cols else [0, len(player_ids) * num_days]
+        day_cols = np.stack(
+            [
+                np.concatenate(
+                    [col_index(kind, players, t) for kind in KINDS]
+                    + [[cols[t]] for cols in chip_cols.values()]
+                    + [share_start + k + players * num_days + t for k in shares]
+                )
+                for t in range(num_days)
+            ]
+        ).astype(np.int32)
+        bound = lp_bound(solver_instance)
 
-        solver_instance.run()
-        solution = solver_instance.getSolution()
+    for iteration_num in range(num_iterations):
+        print(f"\n=== Solving Iteration {iteration_num} ===")
+
+        if warm_start is not None:
+            solver_instance.setSolution(len(warm_start[0]), *warm_start)
+        if rolling_window:
+            solution, model_status = rolling_solve(
+                solver_instance, day_cols, rolling_window, rolling_overlap
+            )
+        else:
+            solver_instance.run()
+            solution = solver_instance.getSolution()
+            model_status = solver_instance.getModelStatus()
 
-        model_status = solver_instance.getModelStatus()
         if (
             model_status != highspy.HighsModelStatus.kOptimal
             and model_status != highspy.HighsModelStatus.kTimeLimit
@@ -591,82 +1216,78 @@ def nba_solver(
             else:
                 return solutions
 
-        values = list(solution.col_value)
-
-        for idx, v in enumerate(model.get_variables()):
-            v.set_value(values[idx])
+        values = np.array(solution.col_value)
+        score = -float(objective @ values + objective_constant)
+        # (player x day x kind) binaries, kinds in KINDS order
+        grid = values[len(week_day_dict) : chip_start].reshape(
+            len(player_ids), -1, len(KINDS)
+        )
+        grid = grid > BINARY_THRESHOLD
+        fill_lineups(grid, idle, positions["pos_1"].to_numpy(dtype=bool))
+        placed = {
+            kind: [
+                f"{a}_{b}"
+                for (a, b), value in zip(all_week_days, values[cols])
+                if value > BINARY_THRESHOLD
+            ]
+            for kind, cols in chip_cols.items()
+        }
+        iteration_wc = list(use_wc) + placed.get("wc", [])
+        iteration_as = list(use_as) + placed.get("as", [])
 
-        print("Score: ", -model.get_objective_value())
+        print("Score: ", score)
         print("Status: ", model_status)
+        if chip_limits:
+            placed_str = ", ".join(f"{k.upper()}{d}" for k in placed for d in placed[k])
+            print("Placed chips: ", placed_str or "-")
+        if rolling_window and bound is not None:
+            print(
+                f"Full-horizon LP bound: {bound:.2f}, "
+                f"gap {100 * (bound - score) / max(abs(bound), 1e-9):.2f}%"
+            )
 
         # results as df for printing (prisitint sounds so funky ik lmaoo)
-        combined_df = pristine_output_df.copy()
-
-        ev_mapping = {}
-        for a in week_day_dict.keys():
-            for b in week_day_dict[a]:
-                gw_day_key = f"Gameweek {a} - Day {b}"
-                if gw_day_key in data.columns:
-                    ev_mapping[(a, b)] = gw_day_key
-
-        for a in week_day_dict.keys():
-            for b in week_day_dict[a]:
-                day_str = f"{a}_{b}"
-
-                combined_df[f"squad_{day_str}"] = combined_df["id"].apply(
-                    lambda x: 1
-                    if x in player_ids
-                    and squad_var[x, a, b].get_value() > BINARY_THRESHOLD
-                    else 0
-                )
-                combined_df[f"team_{day_str}"] = combined_df["id"].apply(
-                    lambda x: 1
-                    if x in player_ids
-                    and team_var[x, a, b].get_value() > BINARY_THRESHOLD
-                    else 0
-                )
-                combined_df[f"cap_{day_str}"] = combined_df["id"].apply(
-                    lambda x: 1
-                    if x in player_ids
-                    and cap_var[x, a, b].get_value() > BINARY_THRESHOLD
-                    else 0
-                )
-
-                ev_key = (a, b)
-                if ev_key in ev_mapping:
-                    ev_col = ev_mapping[ev_key]
-                    points_map = pristine_data_for_printing.set_index("id")[ev_col]
-                    combined_df[f"xPts_{day_str}"] = combined_df["id"].map(points_map)
+        picked = np.zeros(
+            (len(pristine_output_df), len(all_week_days), len(KINDS)), int
+        )
+        picked[output_rows >= 0] = grid[output_rows[output_rows >= 0]]
+        result_columns = {}
+        for t, (a, b) in enumerate(all_week_days):
+            day_str = f"{a}_{b}"
+            for k, kind in enumerate(["squad", "team", "cap"]):
+                result_columns[f"{kind}_{day_str}"] = picked[:, t, k]
+            if (a, b) in output_points:
+                result_columns[f"xPts_{day_str}"] = output_points[a, b]
+        combined_df = pd.concat(
+            [
+                pristine_output_df,
+                pd.DataFrame(result_columns, index=pristine_output_df.index),
+            ],
+            axis=1,
+        )
 
         full_player_df = combined_df.copy()
         squad_columns = [col for col in combined_df.columns if col.startswith("squad_")]
         combined_df = combined_df[combined_df[squad_columns].eq(1).any(axis=1)]
 
-        sell_summary_names = []
-        buy_summary_names = []
-        sell_summary_ids = []
-        buy_summary_ids = []
-
         first_gw_day = f"{current_week}_{current_day}"
         first_squad_col = f"squad_{first_gw_day}"
 
-        for _, row in full_player_df.iterrows():
-            if row["current"] != row[first_squad_col]:
-                if row["current"] == 1:
-                    sell_summary_names.append(row["name"])
-                    sell_summary_ids.append(row["id"])
-                else:
-                    buy_summary_names.append(row["name"])
-                    buy_summary_ids.append(row["id"])
+        moved = full_player_df["current"] != full_player_df[first_squad_col]
+        sold = full_player_df[moved & (full_player_df["current"] == 1)]
+        bought = full_player_df[moved & (full_player_df["current"] != 1)]
+        sell_summary_names = sold["name"].tolist()
+        buy_summary_names = bought["name"].tolist()
+        sell_summary_ids = sold["id"].tolist()
+        buy_summary_ids = bought["id"].tolist()
 
-        first_day_lineup_ids = []
         team_col = f"team_{first_gw_day}"
-        for _, row in combined_df.iterrows():
-            if row[team_col] == 1:
-                first_day_lineup_ids.append(row["id"])
+        first_day_lineup_ids = combined_df.loc[
+            combined_df[team_col] == 1, "id"
+        ].tolist()
 
         all_chips = []
-        for wc_day in use_wc:
+        for wc_day in iteration_wc:
             if wc_day:
                 try:
                     wc_week, wc_day_str = wc_day.split("_")
@@ -678,7 +1299,7 @@ def nba_solver(
                 except:  # noqa: E722
                     pass
 
-        for as_day in use_as:
+        for as_day in iteration_as:
             if as_day:
                 try:
                     as_week, as_day_str = as_day.split("_")
@@ -697,14 +1318,13 @@ def nba_solver(
         first_day_buys_str = ", ".join(buy_summary_names) if buy_summary_names else "-"
 
         hits_per_gw = {}
-        for w in week_day_dict.keys():
-            val = penalized_transfers[w].get_value()
-            hits_per_gw[w] = int(round(val)) if val is not None else 0
+        for k, w in enumerate(week_day_dict.keys()):
+            hits_per_gw[w] = int(round(values[k]))
 
         result = {
             "iter": iteration_num,
             "hits": hits_per_gw,
-            "score": -model.get_objective_value(),
+            "score": score,
             "status": "Optimal",
             "sell": first_day_sells_str,
             "buy": first_day_buys_str,
@@ -716,135 +1336,65 @@ def nba_solver(
             "current_week": current_week,
             "current_day": current_day,
             "first_day_lineup_ids": first_day_lineup_ids,
-            "use_wc": use_wc,
-            "use_as": use_as,
+            "use_wc": iteration_wc,
+            "use_as": iteration_as,
             "picks_df": combined_df,
         }
 
         solutions.append(result)
 
-        try:
-            time.sleep(0.1)
-            os.unlink(mps_file_name)
-        except:  # noqa: E722
-            pass
-
         if num_iterations == 1:
             return solutions
 
-        if iteration_criteria == "this_day_transfer_in":
-            transferred_in_players = [
-                p
-                for p in player_ids
-                if transfer_var[p, current_week, current_day].get_value()
-                > BINARY_THRESHOLD
-            ]
-            not_transferred_in_players = [
-                p
-                for p in player_ids
-                if transfer_var[p, current_week, current_day].get_value()
-                < BINARY_THRESHOLD
-            ]
+        first_transfer = col_index("transfer", players, first)
+        first_squad = col_index("squad", players, first)
+        transferred_in = grid[:, first, KINDS.index("transfer")]
+        kept_squad = grid[:, first, KINDS.index("squad")]
 
-            actions = so.expr_sum(
-                1 - transfer_var[p, current_week, current_day]
-                for p in transferred_in_players
-            ) + so.expr_sum(
-                transfer_var[p, current_week, current_day]
-                for p in not_transferred_in_players
+        change = None
+        if iteration_criteria in ("this_day_transfer_in", "this_day_transfer_in_out"):
+            change = flips(
+                first_transfer[transferred_in], first_transfer[~transferred_in]
             )
 
-            model.add_constraint(
-                actions >= iteration_difference,
-                name=f"iter_{iteration_num}_diff_transfer_in",
+        if iteration_criteria in ("this_day_transfer_out", "this_day_transfer_in_out"):
+            eligible_out = np.array(
+                [in_team_flag_for_solver[p] == 1 for p in player_ids], dtype=bool
             )
-
-        elif iteration_criteria == "this_day_transfer_out":
-            eligible_out_players = [
-                p for p in player_ids if in_team_flag_for_solver[p] == 1
-            ]
-
-            transferred_out_set = {
-                p
-                for p in eligible_out_players
-                if squad_var[p, current_week, current_day].get_value()
-                < BINARY_THRESHOLD
-            }
-            not_transferred_out_set = {
-                p for p in eligible_out_players if p not in transferred_out_set
-            }
-
-            actions_was_out = so.expr_sum(
-                squad_var[p, current_week, current_day] for p in transferred_out_set
-            )
-
-            actions_was_in = so.expr_sum(
-                1 - squad_var[p, current_week, current_day]
-                for p in not_transferred_out_set
-            )
-
-            model.add_constraint(
-                actions_was_out + actions_was_in >= iteration_difference,
-                name=f"iter_{iteration_num}_diff_transfer_out",
-            )
-
-        elif iteration_criteria == "this_day_transfer_in_out":
-            transferred_in_players = [
-                p
-                for p in player_ids
-                if transfer_var[p, current_week, current_day].get_value()
-                > BINARY_THRESHOLD
-            ]
-            not_transferred_in_players = [
-                p
-                for p in player_ids
-                if transfer_var[p, current_week, current_day].get_value()
-                < BINARY_THRESHOLD
-            ]
-            actions_in = so.expr_sum(
-                1 - transfer_var[p, current_week, current_day]
-                for p in transferred_in_players
-            ) + so.expr_sum(
-                transfer_var[p, current_week, current_day]
-                for p in not_transferred_in_players
-            )
-
-            eligible_out_players = [
-                p for p in player_ids if in_team_flag_for_solver[p] == 1
-            ]
-            transferred_out_set = {
-                p
-                for p in eligible_out_players
-                if squad_var[p, current_week, current_day].get_value()
-                < BINARY_THRESHOLD
-            }
-            not_transferred_out_set = {
-                p for p in eligible_out_players if p not in transferred_out_set
-            }
-            actions_out = so.expr_sum(
-                squad_var[p, current_week, current_day] for p in transferred_out_set
-            ) + so.expr_sum(
-                1 - squad_var[p, current_week, current_day]
-                for p in not_transferred_out_set
-            )
-
-            model.add_constraint(
-                actions_in + actions_out >= iteration_difference,
-                name=f"iter_{iteration_num}_diff_transfer_in_out",
+            change_out = flips(
+                first_squad[eligible_out & kept_squad],
+                first_squad[eligible_out & ~kept_squad],
             )
+            if change is None:
+                change = change_out
+            else:
+                change = tuple(x + y for x, y in zip(change, change_out))
 
         elif iteration_criteria == "this_day_lineup":
             # the only one which uses iteration_difference i think
             if first_day_lineup_ids:
-                model.add_constraint(
-                    so.expr_sum(
-                        team_var[p, current_week, current_day]
+                change = flips(
+                    [
+                        col("team", p, current_week, current_day)
                         for p in first_day_lineup_ids
-                    )
-                    <= len(first_day_lineup_ids) - iteration_difference,
-                    name=f"iter_{iteration_num}_diff_lineup",
+                    ],
+                    [],
                 )
 
+        if change is not None:
+            cols, coefs, flipped = change
+            solver_instance.addRow(
+                iteration_difference - flipped,
+                highspy.kHighsInf,
+                len(cols),
+                np.array(cols, dtype=np.int32),
+                np.array(coefs, dtype=float),
+            )
+            keep = np.ones(len(values), dtype=bool)
+            keep[np.concatenate(repair)] = False
+            kept = np.flatnonzero(keep).astype(np.int32)
+            warm_start = (kept, np.round(values[kept]))
+
         # end of iteration
 
     return solutions